@@ -1,8 +1,102 @@
 """CalDAV connection and operations."""
 
+import inspect
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+
 import caldav
+from caldav.elements import cdav, dav
 from icalendar import Calendar
 
+FETCH_WORKERS = 16
+
+# Saved sync tokens and item indexes, keyed by calendar URL
+SYNC_STATE_FILE = ".synctoken"
+
+# Line-anchored scans over unfolded iCalendar text, used to skip full parsing
+_FOLD_RE = re.compile(r"\r?\n[ \t]")
+_UID_RE = re.compile(r"^UID(?:;[^:\r\n]*)?:(.*?)\r?$", re.M | re.I)
+_HASH_RE = re.compile(r"^X-CANVAS-HASH(?:;[^:\r\n]*)?:(.*?)\r?$", re.M | re.I)
+_BEGIN_RE = re.compile(r"^BEGIN:(VTODO|VEVENT)\r?$", re.M | re.I)
+
+# One calendar-query REPORT for all tasks and events, asking only for the
+# properties the sync compares (RFC 4791 section 9.6) plus the ETag
+_EXISTING_QUERY = """<?xml version="1.0" encoding="utf-8"?>
+<C:calendar-query xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">
+  <D:prop>
+    <D:getetag/>
+    <C:calendar-data>
+      <C:comp name="VCALENDAR">
+        <C:comp name="VTODO">
+          <C:prop name="UID"/>
+          <C:prop name="X-CANVAS-HASH"/>
+        </C:comp>
+        <C:comp name="VEVENT">
+          <C:prop name="UID"/>
+          <C:prop name="X-CANVAS-HASH"/>
+        </C:comp>
+      </C:comp>
+    </C:calendar-data>
+  </D:prop>
+  <C:filter><C:comp-filter name="VCALENDAR"/></C:filter>
+</C:calendar-query>"""
+
+_RESOURCE_CLASSES = {"VTODO": caldav.Todo, "VEVENT": caldav.Event}
+
+
+class ExistingItem:
+    """A task or event already on the server, with its stored Canvas hash.
+
+    The iCalendar component is only parsed from the raw data when first used.
+    Items from the sync index or the partial query carry no data, so theirs
+    is fetched then.
+    """
+
+    __slots__ = ("hash", "object", "component_name", "_data", "_component")
+
+    def __init__(self, hash: str, object, data, component_name: str, component=None):
+        self.hash = hash
+        self.object = object
+        self.component_name = component_name
+        self._data = data
+        self._component = component
+
+    @property
+    def etag(self) -> str | None:
+        return self.object.props.get(dav.GetEtag.tag)
+
+    def reload(self):
+        """Fetch the item again, e.g. after a write found it changed."""
+        self._data = self.object.load().data
+        self._component = None
+
+    @property
+    def component(self):
+        if self._component is None:
+            if self._data is None:
+                self._data = self.object.load().data
+            self._component = _find_component(
+                Calendar.from_ical(self._data), self.component_name
+            )
+        return self._component
+
+
+def _resized_adapter(adapter, pool_size: int):
+    """Rebuild an HTTP adapter with a larger pool and otherwise the same settings."""
+    # The adapter keeps each constructor argument as an attribute of the same
+    # name, with or without a leading underscore, which works for both
+    # requests and niquests
+    settings = {}
+    for name in inspect.signature(type(adapter)).parameters:
+        for attr in (f"_{name}", name):
+            if hasattr(adapter, attr):
+                settings[name] = getattr(adapter, attr)
+                break
+    settings["pool_connections"] = max(settings.get("pool_connections", 0), pool_size)
+    settings["pool_maxsize"] = max(settings.get("pool_maxsize", 0), pool_size)
+    return type(adapter)(**settings)
+
 
 def connect_caldav(config: dict):
     """Connect to CalDAV server and find the target calendar."""
@@ -16,21 +110,28 @@ def connect_caldav(config: dict):
         password=caldav_config["password"],
     )
 
+    # Keep enough pooled connections for the concurrent reads and writes
+    for scheme in ("https://", "http://"):
+        adapter = client.session.get_adapter(scheme)
+        client.session.mount(scheme, _resized_adapter(adapter, FETCH_WORKERS))
+
     principal = client.principal()
     calendars = principal.calendars()
 
     target_calendar = None
     target_name = caldav_config["calendar_name"]
 
-    print(f"\n📋 Available calendars:")
-
+    # Stop at the first match; fetching names can cost a request per calendar
     for cal in calendars:
-        cal_name = cal.name
-        print(f"   - {cal_name}")
-        if cal_name == target_name:
+        if cal.name == target_name:
             target_calendar = cal
+            break
 
     if not target_calendar:
+        print(f"\n📋 Available calendars:")
+        for cal in calendars:
+            print(f"   - {cal.name}")
+
         print(f"\n⚠️  Calendar '{target_name}' not found!")
         print("Creating new calendar...")
         target_calendar = principal.make_calendar(name=target_name)
@@ -39,51 +140,316 @@ def connect_caldav(config: dict):
     return target_calendar
 
 
-def get_existing_items(calendar) -> tuple[dict, dict]:
-    """Get existing tasks and events with their UIDs, hashes, and objects."""
-    existing_todos = {}
-    existing_events = {}
+def _load_data(obj) -> tuple:
+    """Return an object with its iCalendar data, fetching it if the listing omitted it."""
+    try:
+        if obj.data is None:
+            obj.load()
+        return obj, obj.data
+    except Exception:
+        return obj, None
+
+
+def _find_component(ical, component_name: str):
+    """Return the first top-level component with the given name, if any."""
+    # Each resource wraps a single component, so only check the top level
+    for component in ical.subcomponents:
+        if component.name == component_name:
+            return component
+    return None
+
+
+def _scan_uid_and_hash(data: str, component_name: str) -> tuple[str, str] | None:
+    """Read UID and X-CANVAS-HASH from raw data, or None if it needs a full parse."""
+    unfolded = _FOLD_RE.sub("", data)
+    if not re.search(rf"^BEGIN:{component_name}\r?$", unfolded, re.M):
+        return None
+
+    # More than one UID (alarms, recurrence overrides) or escaped text needs icalendar
+    uids = _UID_RE.findall(unfolded)
+    if len(uids) != 1 or "\\" in uids[0]:
+        return None
+
+    match = _HASH_RE.search(unfolded)
+    return uids[0], match.group(1) if match else ""
+
+
+def _parse_resource(obj, data, component_name: str) -> tuple[str, ExistingItem] | None:
+    """Build a (UID, ExistingItem) pair from one resource's data, if it matches."""
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+
+    scanned = _scan_uid_and_hash(data, component_name)
+    if scanned:
+        uid, stored_hash = scanned
+        return uid, ExistingItem(stored_hash, obj, data, component_name)
+
+    component = _find_component(Calendar.from_ical(data), component_name)
+    if component is not None:
+        uid = str(component.get("UID", ""))
+        if uid:
+            stored_hash = str(component.get("X-CANVAS-HASH", ""))
+            return uid, ExistingItem(stored_hash, obj, data, component_name, component)
+    return None
+
+
+def _parse_any(obj, data) -> tuple[str, str, ExistingItem] | None:
+    """Parse a resource as a task or an event, returning (component, UID, item)."""
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+
+    # The first component line says which type to scan for, so the scanner
+    # only falls back to a full parse for data it can't handle
+    match = _BEGIN_RE.search(data)
+    if not match:
+        return None
+    component_name = match.group(1).upper()
+    parsed = _parse_resource(obj, data, component_name)
+    if parsed:
+        return component_name, *parsed
+    return None
+
+
+def _parse_existing(resources: list, component_name: str) -> dict[str, ExistingItem]:
+    """Index (object, data) pairs by UID with their stored hashes."""
+    existing = {}
+    for obj, data in resources:
+        if data is None:
+            continue
+        try:
+            parsed = _parse_resource(obj, data, component_name)
+            if parsed:
+                uid, item = parsed
+                existing[uid] = item
+        except Exception:
+            pass
+    return existing
+
+
+def put_item(item: ExistingItem, ical: str) -> bool:
+    """Overwrite an item in place; False if it changed since it was read.
+
+    The PUT carries the item's ETag in If-Match, so a concurrent edit on the
+    server makes it fail with 412 instead of being overwritten.
+    """
+    headers = {
+        "Content-Type": "text/calendar; charset=utf-8",
+        "If-Match": item.etag or "*",
+    }
+    obj = item.object
+    response = obj.client.put(str(obj.url), ical, headers)
+    if response.status == 412:
+        return False
+    if response.status not in (200, 201, 204):
+        raise caldav.error.PutError(f"{response.status} {response.reason}")
 
-    # Get existing todos
+    # Keep the new ETag, or none if the server didn't send it
+    etag = response.headers.get("Etag")
+    if etag:
+        obj.props[dav.GetEtag.tag] = etag
+    else:
+        obj.props.pop(dav.GetEtag.tag, None)
+    return True
+
+
+def load_sync_state(path: str = SYNC_STATE_FILE) -> dict:
+    """Load saved sync tokens and item indexes, keyed by calendar URL."""
     try:
-        todos = calendar.todos(include_completed=True)
-        for todo in todos:
-            try:
-                ical = Calendar.from_ical(todo.data)
-                for component in ical.walk():
-                    if component.name == "VTODO":
-                        uid = str(component.get("UID", ""))
-                        if uid:
-                            stored_hash = str(component.get("X-CANVAS-HASH", ""))
-                            existing_todos[uid] = {
-                                "hash": stored_hash,
-                                "object": todo,
-                                "component": component,
-                            }
-            except Exception:
-                pass
-    except Exception as e:
-        print(f"⚠️  Could not fetch existing tasks: {e}")
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_sync_state(state: dict, path: str = SYNC_STATE_FILE):
+    """Save sync tokens and item indexes for the next run."""
+    # The writes are already done, so a read-only directory only costs the
+    # next run its incremental sync
+    try:
+        with open(path, "w") as f:
+            json.dump(state, f)
+    except OSError as e:
+        print(f"⚠️  Could not save sync state to {path}: {e}")
+
+
+def _get_sync_token(calendar) -> str | None:
+    """Ask the server for the calendar's current sync token, if it has one."""
+    try:
+        return calendar.get_property(dav.SyncToken())
+    except Exception:
+        return None
+
 
-    # Get existing events
+def _load_changed(obj) -> tuple:
+    """Load a resource reported by a sync REPORT; data is None if it was deleted."""
     try:
-        events = calendar.events()
-        for event in events:
-            try:
-                ical = Calendar.from_ical(event.data)
-                for component in ical.walk():
-                    if component.name == "VEVENT":
-                        uid = str(component.get("UID", ""))
-                        if uid:
-                            stored_hash = str(component.get("X-CANVAS-HASH", ""))
-                            existing_events[uid] = {
-                                "hash": stored_hash,
-                                "object": event,
-                                "component": component,
-                            }
-            except Exception:
-                pass
+        obj.load()
+    except caldav.error.NotFoundError:
+        return obj, None
+    return obj, obj.data
+
+
+def _index_items(*existing: dict[str, ExistingItem]) -> dict:
+    """Map resource URLs to the UID, hash and component type stored there."""
+    return {
+        str(item.object.url): {
+            "uid": uid,
+            "hash": item.hash,
+            "component": item.component_name,
+            "etag": item.etag,
+        }
+        for items in existing
+        for uid, item in items.items()
+    }
+
+
+def _sync_changes(
+    calendar, sync_state: dict
+) -> tuple[dict[str, ExistingItem], dict[str, ExistingItem]]:
+    """Update the saved item index with server changes since the saved sync token."""
+    changes = calendar.objects_by_sync_token(
+        sync_token=sync_state["token"], load_objects=False, disable_fallback=True
+    )
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        resources = list(executor.map(_load_changed, changes.objects))
+    print(f"   🔁 {len(resources)} server changes since last sync")
+
+    index = dict(sync_state.get("items", {}))
+    changed = {"VTODO": {}, "VEVENT": {}}
+    for obj, data in resources:
+        href = str(obj.url)
+        index.pop(href, None)
+        if data is None:
+            continue
+        try:
+            parsed = _parse_any(obj, data)
+        except Exception:
+            continue
+        if parsed:
+            component_name, uid, item = parsed
+            changed[component_name][uid] = item
+            index[href] = {
+                "uid": uid,
+                "hash": item.hash,
+                "component": component_name,
+                "etag": item.etag,
+            }
+
+    # Unchanged items come from the index and are only loaded if they get updated
+    existing = {"VTODO": {}, "VEVENT": {}}
+    for href, entry in index.items():
+        component_name = entry["component"]
+        props = {dav.GetEtag.tag: entry["etag"]} if entry.get("etag") else {}
+        obj = _RESOURCE_CLASSES[component_name](
+            client=calendar.client, url=href, parent=calendar, props=props
+        )
+        existing[component_name][entry["uid"]] = ExistingItem(
+            entry["hash"], obj, None, component_name
+        )
+    for component_name, items in changed.items():
+        existing[component_name].update(items)
+
+    sync_state["token"] = changes.sync_token
+    sync_state["items"] = index
+    return existing["VTODO"], existing["VEVENT"]
+
+
+def _query_existing(
+    calendar,
+) -> tuple[dict[str, ExistingItem], dict[str, ExistingItem]]:
+    """Read the UID and hash of every task and event with one partial REPORT."""
+    response = calendar.client.report(str(calendar.url), _EXISTING_QUERY, depth=1)
+    # An error or a half-answered query would make every item look new, and
+    # adding them again overwrites the stored ones
+    if response.status != 207:
+        raise caldav.error.ReportError(f"{response.status} {response.reason}")
+    results = response.expand_simple_props([cdav.CalendarData(), dav.GetEtag()])
+
+    existing = {"VTODO": {}, "VEVENT": {}}
+    for href, props in results.items():
+        data = props.pop(cdav.CalendarData.tag, None)
+        url = calendar.url.join(href)
+        if url == calendar.url:
+            continue
+        if not data:
+            raise caldav.error.ReportError(f"no calendar data for {href}")
+        try:
+            parsed = _parse_any(None, data)
+        except Exception:
+            continue
+        if parsed:
+            # The data is only a few properties, so the full resource is
+            # fetched if the item turns out to need an update
+            component_name, uid, item = parsed
+            obj = _RESOURCE_CLASSES[component_name](
+                client=calendar.client, url=url, parent=calendar, props=props
+            )
+            existing[component_name][uid] = ExistingItem(
+                item.hash, obj, None, component_name
+            )
+    return existing["VTODO"], existing["VEVENT"]
+
+
+def _list_existing(
+    calendar,
+) -> tuple[dict[str, ExistingItem], dict[str, ExistingItem]]:
+    """List and parse every task and event, for servers without partial queries."""
+    todos = []
+    events = []
+
+    # Listing and any per-item GETs are network-bound, so share one pool across both
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        todos_future = executor.submit(calendar.todos, include_completed=True)
+        events_future = executor.submit(calendar.events)
+
+        try:
+            todos = todos_future.result()
+        except Exception as e:
+            print(f"⚠️  Could not fetch existing tasks: {e}")
+
+        try:
+            events = events_future.result()
+        except Exception as e:
+            print(f"⚠️  Could not fetch existing events: {e}")
+
+        resources = list(executor.map(_load_data, todos + events))
+
+    # Parsing is CPU-bound, so keep it serial
+    existing_todos = _parse_existing(resources[: len(todos)], "VTODO")
+    existing_events = _parse_existing(resources[len(todos) :], "VEVENT")
+
+    return existing_todos, existing_events
+
+
+def get_existing_items(
+    calendar, sync_state: dict | None = None
+) -> tuple[dict[str, ExistingItem], dict[str, ExistingItem]]:
+    """Get existing tasks and events with their UIDs, hashes, and objects.
+
+    If sync_state is given, it holds this calendar's saved sync token and item
+    index.  With a token only changes since the last run are fetched (RFC 6578);
+    otherwise one partial query reads every UID and hash, falling back to full
+    listings if the server rejects it.  sync_state is updated in place either way.
+    """
+    if sync_state and sync_state.get("token"):
+        try:
+            return _sync_changes(calendar, sync_state)
+        except Exception as e:
+            print(f"⚠️  Incremental sync unavailable, fetching all items: {e}")
+
+    # Take the token before listing, so changes made meanwhile show up next run
+    sync_token = _get_sync_token(calendar) if sync_state is not None else None
+
+    try:
+        existing_todos, existing_events = _query_existing(calendar)
     except Exception as e:
-        print(f"⚠️  Could not fetch existing events: {e}")
+        print(f"⚠️  Partial calendar query failed, listing all items: {e}")
+        existing_todos, existing_events = _list_existing(calendar)
+
+    if sync_state is not None:
+        sync_state.clear()
+        if sync_token:
+            sync_state["token"] = sync_token
+            sync_state["items"] = _index_items(existing_todos, existing_events)
 
     return existing_todos, existing_events
@@ -4,8 +4,10 @@ import requests
 from icalendar import Calendar
 from datetime import datetime, date
 import re
+import sys
 
 from config import parse_end_date
+from ical_helpers import task_description
 
 
 # Define keywords for specific assignment types
@@ -23,6 +25,24 @@ ASSIGNMENT_TYPE_KEYWORDS = {
 }
 DEFAULT_ASSIGNMENT_TYPE_TAG = "Assignment"
 
+# Categories assigned to feed items by _classify
+CATEGORY_ASSIGNMENT = 0
+CATEGORY_NO_CLASS = 1
+CATEGORY_SKIPPED = 2
+
+FEED_CHUNK_SIZE = 64 * 1024
+FEED_TIMEOUT = 30  # seconds
+
+# Matches patterns like "[COURSE-ID-SECTION Course Name]" or "[COURSE-ID Course Name]"
+_COURSE_ID_RE = re.compile(r"\[([A-Z0-9-]+)(?:-\d{2})? [^\]]+\]")
+
+# Lowercased keywords per tag, in priority order, matched as whole words
+# (so "lab" does not match "label")
+_KEYWORD_TABLE: list[tuple[str, list[str]]] = [
+    (tag, [k.lower() for k in keywords])
+    for tag, keywords in ASSIGNMENT_TYPE_KEYWORDS.items()
+]
+
 
 def get_item_date(item: dict) -> date | None:
     """Extract date from an item, handling both date and datetime objects."""
@@ -56,176 +76,286 @@ def is_within_date_range(item: dict, end_date: date | None) -> bool:
     return item_date <= end_date
 
 
+def compile_keywords(keywords: list[str]) -> re.Pattern | None:
+    """Compile keywords into a single case-insensitive alternation, or None if empty."""
+    if not keywords:
+        return None
+    return re.compile("|".join(re.escape(k) for k in keywords), re.IGNORECASE)
+
+
+_KEYWORD_RES: dict[tuple[str, ...], re.Pattern | None] = {}
+
+
 def matches_keywords(text: str, keywords: list[str]) -> bool:
     """Check if text contains any of the keywords (case-insensitive)."""
-    if not keywords:
-        return False
-    text_lower = text.lower()
-    return any(keyword.lower() in text_lower for keyword in keywords)
+    key = tuple(keywords)
+    if key not in _KEYWORD_RES:
+        _KEYWORD_RES[key] = compile_keywords(keywords)
+    pattern = _KEYWORD_RES[key]
+    return pattern is not None and pattern.search(text) is not None
 
 
 def extract_course_id_from_summary(summary: str) -> str | None:
     """Extracts a course ID like 'HIST-1700' from a summary string."""
-    # Matches patterns like "[COURSE-ID-SECTION Course Name]" or "[COURSE-ID Course Name]"
     # e.g., "[HIST-1700-07 American History]" -> "HIST-1700"
     # e.g., "[IT-3150 Windows Servers]" -> "IT-3150"
-    match = re.search(r"\[([A-Z0-9-]+)(?:-\d{2})? [^\]]+\]", summary)
+    match = _COURSE_ID_RE.search(summary)
     if match:
         return match.group(1)  # The first captured group is the course ID
     return None
 
 
+def _is_word_char(char: str) -> bool:
+    """Check if a character counts as part of a word, as in regex \\w."""
+    return char.isalnum() or char == "_"
+
+
+def _contains_word(text: str, word: str) -> bool:
+    """Check if word appears in text with a word boundary on both sides."""
+    end = len(text)
+    pos = text.find(word)
+    while pos != -1:
+        after = pos + len(word)
+        if (pos == 0 or not _is_word_char(text[pos - 1])) and (
+            after == end or not _is_word_char(text[after])
+        ):
+            return True
+        pos = text.find(word, pos + 1)
+    return False
+
+
 def get_assignment_type_tag(summary: str) -> str:
     """Determines the assignment type tag based on keywords in the summary."""
-    summary_lower = summary.lower()
-    for tag, keywords in ASSIGNMENT_TYPE_KEYWORDS.items():
+    text = summary.lower()
+    for tag, keywords in _KEYWORD_TABLE:
         for keyword in keywords:
-            # Use regex for whole word matching to avoid false positives (e.g., "lab" not matching "label")
-            if re.search(r"\b" + re.escape(keyword) + r"\b", summary_lower):
+            if _contains_word(text, keyword):
                 return tag
     return DEFAULT_ASSIGNMENT_TYPE_TAG
 
 
-def fetch_canvas_items(config: dict) -> tuple[list, list]:
-    """Download and parse Canvas ICS feed, categorizing items."""
-    print("📥 Downloading Canvas Feed...")
+def _classify(
+    summary: str,
+    uid: str,
+    course_id: str | None,
+    no_class_re: re.Pattern | None,
+    assignment_uid_re: re.Pattern | None,
+    assignment_summary_re: re.Pattern | None,
+) -> int:
+    """Return the category code for a feed item."""
+    # Check for "no classes" events (highest priority)
+    if no_class_re is not None and no_class_re.search(summary):
+        return CATEGORY_NO_CLASS
+    # If it has a course ID and isn't a "no classes" event, it's an assignment
+    if course_id:
+        return CATEGORY_ASSIGNMENT
+    # Otherwise, check for assignments using keywords
+    if assignment_uid_re is not None and assignment_uid_re.search(uid):
+        return CATEGORY_ASSIGNMENT
+    if assignment_summary_re is not None and assignment_summary_re.search(summary):
+        return CATEGORY_ASSIGNMENT
+    # Everything else gets skipped
+    return CATEGORY_SKIPPED
+
+
+def _print_section(
+    title: str,
+    items: list,
+    icon: str,
+    date_label: str,
+    verbose: bool,
+    show_uid: bool = True,
+):
+    """Write a section header and, if verbose, its items with a single write."""
+    lines = ["", "=" * 70, title, "=" * 70]
+    if verbose:
+        for item in items:
+            item_date = item.get("dtstart")
+            date_str = str(item_date.dt) if item_date else "No date"
+            tags_str = ""
+            if item.get("course_id"):
+                tags_str += f" [{item['course_id']}]"
+            if item.get("type_tag"):
+                tags_str += f" [{item['type_tag']}]"
+            lines.append(f"   {icon} {item['summary'][:50]}{tags_str}")
+            lines.append(f"      {date_label}: {date_str}")
+            if show_uid:
+                lines.append(f"      UID: {item['uid']}")
+            lines.append("")
+    sys.stdout.write("\n".join(lines) + "\n")
 
-    feed_url = config["canvas"]["feed_url"]
-    end_date = parse_end_date(config["sync"].get("end_date", ""))
+
+def load_sync_settings(config: dict) -> dict:
+    """Read the feed filtering settings from config, compiling keyword patterns."""
+    sync_config = config["sync"]
 
     # Get keywords from config with defaults
-    no_class_keywords = config["sync"].get(
+    no_class_keywords = sync_config.get(
         "no_class_keywords", ["no classes", "no school", "holiday", "break"]
     )
-    assignment_uid_keywords = config["sync"].get("assignment_keywords", ["assignment"])
-    assignment_summary_keywords = config["sync"].get("assignment_summary_keywords", [])
-
+    assignment_uid_keywords = sync_config.get("assignment_keywords", ["assignment"])
+    assignment_summary_keywords = sync_config.get("assignment_summary_keywords", [])
+
+    return {
+        "end_date": parse_end_date(sync_config.get("end_date", "")),
+        "verbose": sync_config.get("verbose", True),
+        "delete_removed": sync_config.get("delete_removed", False),
+        "no_class_keywords": no_class_keywords,
+        "assignment_uid_keywords": assignment_uid_keywords,
+        "assignment_summary_keywords": assignment_summary_keywords,
+        "no_class_re": compile_keywords(no_class_keywords),
+        "assignment_uid_re": compile_keywords(assignment_uid_keywords),
+        "assignment_summary_re": compile_keywords(assignment_summary_keywords),
+    }
+
+
+def print_sync_settings(settings: dict):
+    """Print the date filter and keywords a sync will use."""
+    end_date = settings["end_date"]
     if end_date:
         print(f"📅 Filtering items until: {end_date.strftime('%B %d, %Y')}")
     else:
         print("📅 No date filter - syncing all items")
 
-    print(f"🔍 No-class keywords: {no_class_keywords}")
-    print(f"🔍 Assignment UID keywords: {assignment_uid_keywords}")
-    print(f"🔍 Assignment summary keywords: {assignment_summary_keywords}")
+    print(f"🔍 No-class keywords: {settings['no_class_keywords']}")
+    print(f"🔍 Assignment UID keywords: {settings['assignment_uid_keywords']}")
+    summary_keywords = settings["assignment_summary_keywords"]
+    print(f"🔍 Assignment summary keywords: {summary_keywords}")
+
+
+def fetch_canvas_feed(config: dict) -> bytes:
+    """Download the raw Canvas ICS feed."""
+    # Stream the feed into a single buffer (iter_content handles gzip transparently)
+    feed_data = bytearray()
+    with requests.get(
+        config["canvas"]["feed_url"],
+        stream=True,
+        timeout=FEED_TIMEOUT,
+        headers={"Accept-Encoding": "gzip"},
+    ) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(FEED_CHUNK_SIZE):
+            feed_data += chunk
+    return bytes(feed_data)
+
+
+def parse_canvas_feed(feed_data: bytes) -> Calendar:
+    """Parse a downloaded Canvas ICS feed."""
+    return Calendar.from_ical(feed_data)
 
-    response = requests.get(feed_url)
-    response.raise_for_status()
 
-    cal = Calendar.from_ical(response.content)
+def classify_items(cal: Calendar, settings: dict) -> tuple[list, list, list, list]:
+    """Split feed events into assignments, no-class days, skipped and filtered out."""
+    end_date = settings["end_date"]
+    no_class_re = settings["no_class_re"]
+    assignment_uid_re = settings["assignment_uid_re"]
+    assignment_summary_re = settings["assignment_summary_re"]
+
     assignments = []
     no_class_events = []
     skipped = []
     filtered_out = []
 
-    for component in cal.walk():
-        if component.name == "VEVENT":
-            summary = str(component.get("SUMMARY", ""))
-            uid = str(component.get("UID", ""))
-            dtstart = component.get("DTSTART")
-            dtend = component.get("DTEND")
-
-            item_info = {
-                "uid": uid,
-                "summary": summary,
-                "dtstart": dtstart,
-                "dtend": dtend,
-                "description": str(component.get("DESCRIPTION", "")),
-                "url": str(component.get("URL", "")),
-                "location": str(component.get("LOCATION", "")),
-            }
-
-            # Extract course ID and add to item_info
-            course_id = extract_course_id_from_summary(summary)
-            if course_id:
-                item_info["course_id"] = course_id
-
-            # Check date range first
-            if not is_within_date_range(item_info, end_date):
-                filtered_out.append(item_info)
-                continue
-
-            # Check for "no classes" events (highest priority)
-            if matches_keywords(summary, no_class_keywords):
-                no_class_events.append(item_info)
-            # If it has a course ID and isn't a "no classes" event, it's an assignment
-            elif item_info.get("course_id"):
-                assignments.append(item_info)
-            # Otherwise, check for assignments using keywords
-            elif matches_keywords(uid, assignment_uid_keywords) or matches_keywords(
-                summary, assignment_summary_keywords
-            ):
-                assignments.append(item_info)
-            # Everything else gets skipped
-            else:
-                skipped.append(item_info)
-
-            # --- New: Determine assignment type tag for items going into assignments ---
-            if item_info in assignments:
-                item_info["type_tag"] = get_assignment_type_tag(summary)
-
-    # Print assignments
-    print(f"\n{'='*70}")
-    print(f"📚 ASSIGNMENTS → Tasks ({len(assignments)} found)")
-    print(f"{'='*70}")
-    for item in assignments:
-        due = item.get("dtstart")
-        due_str = str(due.dt) if due else "No date"
-        tags_str = ""
-        if item.get("course_id"):
-            tags_str += f" [{item['course_id']}]"
-        if item.get("type_tag"):
-            tags_str += f" [{item['type_tag']}]"
-
-        print(f"   📝 {item['summary'][:50]}{tags_str}")
-        print(f"      Due: {due_str}")
-        print(f"      UID: {item['uid']}")
-        print()
-
-    # Print no class events
-    print(f"\n{'='*70}")
-    print(f"🏖️  NO CLASS DAYS → Calendar Events ({len(no_class_events)} found)")
-    print(f"{'='*70}")
-    for item in no_class_events:
-        item_date = item.get("dtstart")
-        date_str = str(item_date.dt) if item_date else "No date"
-        tags_str = ""
-        if item.get("course_id"):
-            tags_str += f" [{item['course_id']}]"  # No-class events can still have course IDs in summary
-        print(f"   🎉 {item['summary'][:50]}{tags_str}")
-        print(f"      Date: {date_str}")
-        print(f"      UID: {item['uid']}")
-        print()
-
-    # Print skipped
-    print(f"\n{'='*70}")
-    print(f"⏭️  SKIPPED ({len(skipped)} found)")
-    print(f"{'='*70}")
-    for item in skipped:
-        item_date = item.get("dtstart")
-        date_str = str(item_date.dt) if item_date else "No date"
-        tags_str = ""
-        if item.get("course_id"):
-            tags_str += f" [{item['course_id']}]"
-        print(f"   ❌ {item['summary'][:50]}{tags_str}")
-        print(f"      Date: {date_str}")
-        print(f"      UID: {item['uid']}")
-        print()
-
-    # Print filtered out (past end date)
+    # Canvas VEVENTs sit directly under VCALENDAR, so skip the recursive walk()
+    for component in cal.subcomponents:
+        if component.name != "VEVENT":
+            continue
+
+        summary = str(component.get("SUMMARY", ""))
+        uid = str(component.get("UID", ""))
+        dtstart = component.get("DTSTART")
+        dtend = component.get("DTEND")
+
+        item_info = {
+            "uid": uid,
+            "summary": summary,
+            "dtstart": dtstart,
+            "dtend": dtend,
+            "description": str(component.get("DESCRIPTION", "")),
+            "url": str(component.get("URL", "")),
+            "location": str(component.get("LOCATION", "")),
+        }
+
+        # Extract course ID and add to item_info
+        course_id = extract_course_id_from_summary(summary)
+        if course_id:
+            item_info["course_id"] = course_id
+
+        # Check date range first
+        if not is_within_date_range(item_info, end_date):
+            filtered_out.append(item_info)
+            continue
+
+        category = _classify(
+            summary,
+            uid,
+            course_id,
+            no_class_re,
+            assignment_uid_re,
+            assignment_summary_re,
+        )
+        if category == CATEGORY_NO_CLASS:
+            no_class_events.append(item_info)
+        elif category == CATEGORY_ASSIGNMENT:
+            # Assignments are tagged with their type as they are categorized
+            item_info["type_tag"] = get_assignment_type_tag(summary)
+            # Built once so writing the task and diffing it use the same text
+            item_info["description_full"] = task_description(item_info)
+            assignments.append(item_info)
+        else:
+            skipped.append(item_info)
+
+    return assignments, no_class_events, skipped, filtered_out
+
+
+def print_canvas_summary(
+    assignments: list,
+    no_class_events: list,
+    skipped: list,
+    filtered_out: list,
+    settings: dict,
+):
+    """Print the categorized feed items."""
+    # Each section is written in one go; per-item detail only when verbose
+    verbose = settings["verbose"]
+    end_date = settings["end_date"]
+    _print_section(
+        f"📚 ASSIGNMENTS → Tasks ({len(assignments)} found)",
+        assignments,
+        "📝",
+        "Due",
+        verbose,
+    )
+    _print_section(
+        f"🏖️  NO CLASS DAYS → Calendar Events ({len(no_class_events)} found)",
+        no_class_events,
+        "🎉",
+        "Date",
+        verbose,
+    )
+    _print_section(
+        f"⏭️  SKIPPED ({len(skipped)} found)", skipped, "❌", "Date", verbose
+    )
     if filtered_out:
-        end_date = parse_end_date(config["sync"].get("end_date", ""))
-        print(f"\n{'='*70}")
-        print(f"📆 FILTERED OUT - After {end_date} ({len(filtered_out)} found)")
-        print(f"{'='*70}")
-        for item in filtered_out:
-            item_date = item.get("dtstart")
-            date_str = str(item_date.dt) if item_date else "No date"
-            tags_str = ""
-            if item.get("course_id"):
-                tags_str += f" [{item['course_id']}]"
-            print(f"   🚫 {item['summary'][:50]}{tags_str}")
-            print(f"      Date: {date_str}")
-            print()
+        _print_section(
+            f"📆 FILTERED OUT - After {end_date} ({len(filtered_out)} found)",
+            filtered_out,
+            "🚫",
+            "Date",
+            verbose,
+            show_uid=False,
+        )
+
+
+def fetch_canvas_items(config: dict) -> tuple[list, list]:
+    """Download and parse Canvas ICS feed, categorizing items."""
+    settings = load_sync_settings(config)
+
+    print("📥 Downloading Canvas Feed...")
+    print_sync_settings(settings)
+
+    cal = parse_canvas_feed(fetch_canvas_feed(config))
+    assignments, no_class_events, skipped, filtered_out = classify_items(cal, settings)
+    print_canvas_summary(assignments, no_class_events, skipped, filtered_out, settings)
 
     return assignments, no_class_events
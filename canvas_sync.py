@@ -6,11 +6,21 @@ Also adds "no classes" events to the School calendar
 """
 
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import requests
 
 from config import load_config
-from canvas import fetch_canvas_items
-from caldav_client import connect_caldav
+from canvas import (
+    load_sync_settings,
+    print_sync_settings,
+    fetch_canvas_feed,
+    parse_canvas_feed,
+    classify_items,
+    print_canvas_summary,
+)
+from caldav_client import SYNC_STATE_FILE, connect_caldav
 from sync import sync_to_caldav
 
 
@@ -22,20 +32,59 @@ def main(config_path: str = "config.toml"):
 
     try:
         config = load_config(config_path)
+        settings = load_sync_settings(config)
+
+        print("📥 Downloading Canvas Feed...")
+        print_sync_settings(settings)
+
+        password = config["caldav"].get("password", "")
+
+        # The Canvas download and CalDAV connection are independent, so overlap them
+        calendar = None
+        connect_error = None
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            feed_future = executor.submit(fetch_canvas_feed, config)
+            calendar_future = (
+                executor.submit(connect_caldav, config) if password else None
+            )
 
-        assignments, no_class_events = fetch_canvas_items(config)
+            cal = parse_canvas_feed(feed_future.result())
+            assignments, no_class_events, skipped, filtered_out = classify_items(
+                cal, settings
+            )
+
+            # Wait for the connection before printing, so its output isn't
+            # interleaved; a failure is reported after the feed summary
+            if calendar_future is not None:
+                try:
+                    calendar = calendar_future.result()
+                except Exception as e:
+                    connect_error = e
+
+        print_canvas_summary(
+            assignments, no_class_events, skipped, filtered_out, settings
+        )
 
         if not assignments and not no_class_events:
             print("\n📭 No items found to sync")
             return
 
-        password = config["caldav"].get("password", "")
         if not password:
             print("\n⚠️  No password set - skipping CalDAV sync (list-only mode)")
             return
 
-        calendar = connect_caldav(config)
-        sync_to_caldav(assignments, no_class_events, calendar)
+        if connect_error is not None:
+            raise connect_error
+
+        sync_to_caldav(
+            assignments,
+            no_class_events,
+            calendar,
+            delete_removed=settings["delete_removed"],
+            verbose=settings["verbose"],
+            # Next to the config, so it doesn't depend on where the job runs from
+            state_path=str(Path(config_path).with_name(SYNC_STATE_FILE)),
+        )
 
         print("\n✨ Sync complete!")
 
@@ -1,9 +1,14 @@
 """Configuration loading and management."""
 
+import copy
+import functools
 import tomllib
 from pathlib import Path
 from datetime import datetime, date
 
+# Parsed configs keyed by resolved path, with the mtime they were read at
+_CFG_CACHE: dict[str, tuple[int, dict]] = {}
+
 
 def load_config(config_path: str = "config.toml") -> dict:
     """Load configuration from TOML file."""
@@ -16,8 +21,17 @@ def load_config(config_path: str = "config.toml") -> dict:
         print(f"   Please edit {config_path} and run again.")
         exit(1)
 
-    with open(path, "rb") as f:
-        return tomllib.load(f)
+    # Reuse the parsed config until the file changes on disk
+    cache_key = str(path.resolve())
+    mtime = path.stat().st_mtime_ns
+    cached = _CFG_CACHE.get(cache_key)
+    if cached is None or cached[0] != mtime:
+        with open(path, "rb") as f:
+            cached = (mtime, tomllib.load(f))
+        _CFG_CACHE[cache_key] = cached
+
+    # Callers may modify the returned dict, so hand out a copy
+    return copy.deepcopy(cached[1])
 
 
 def create_default_config(path: Path):
@@ -43,6 +57,14 @@ calendar_name = "School"
 # Format: YYYY-MM-DD
 end_date = "2026-05-08"
 
+# List every item found in the Canvas feed and what changed in each updated
+# item (set to false to print only counts, e.g. for unattended runs)
+verbose = true
+
+# Delete synced tasks and events that are no longer in the Canvas feed
+# (including items now past end_date); other items are never touched
+delete_removed = false
+
 # Keywords to identify "no class" events (case-insensitive)
 # Events with these words in the summary become calendar events
 no_class_keywords = ["no classes", "no school", "holiday", "break"]
@@ -90,6 +112,7 @@ assignment_summary_keywords = [
         f.write(default_config)
 
 
+@functools.lru_cache(maxsize=8)
 def parse_end_date(date_str: str) -> date | None:
     """Parse end date from config string."""
     if not date_str or date_str.strip() == "":
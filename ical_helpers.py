@@ -1,213 +1,363 @@
-"""iCalendar component creation and manipulation."""
+"""iCalendar component creation and manipulation.
 
+Outbound VTODO/VEVENT components are rendered straight to iCalendar text;
+icalendar is only used to parse what comes back from the server.
+"""
+
+import functools
 import hashlib
-from datetime import datetime, timezone
-from icalendar import Todo, Event
+from datetime import datetime, date, timezone
+
+PRODID = "-//Canvas Task Sync//EN"
+
+# The VCALENDAR wrapper is identical for every item, so it is rendered once
+_ICAL_PREFIX = f"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:{PRODID}\r\n"
+_ICAL_SUFFIX = "END:VCALENDAR\r\n"
+
+# RFC 5545 content lines are limited to 75 octets, excluding the CRLF
+_MAX_LINE_OCTETS = 75
 
 
 def compute_item_hash(item: dict) -> str:
     """Compute a hash of item content to detect changes."""
-    content = f"{item.get('summary', '')}"
-    content += f"|{item.get('description', '')}"
-    content += f"|{item.get('url', '')}"
-    content += f"|{item.get('location', '')}"
-
+    # The cache key holds every hashed field, so any content change misses it
     dtstart = item.get("dtstart")
-    if dtstart:
-        content += f"|start:{dtstart.dt}"
     dtend = item.get("dtend")
-    if dtend:
-        content += f"|end:{dtend.dt}"
+    return _hash_fields(
+        str(item.get("summary", "")),
+        str(item.get("description", "")),
+        str(item.get("url", "")),
+        str(item.get("location", "")),
+        str(dtstart.dt) if dtstart else None,
+        str(dtend.dt) if dtend else None,
+        item.get("course_id") or None,
+        item.get("type_tag") or None,
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def _hash_fields(
+    summary: str,
+    description: str,
+    url: str,
+    location: str,
+    start: str | None,
+    end: str | None,
+    course_id: str | None,
+    type_tag: str | None,
+) -> str:
+    """Hash the normalized item fields; repeat syncs in one process hit the cache."""
+    # Fields are fed to the hasher one by one instead of being joined into a
+    # single string first; the bytes hashed are the same, so stored hashes hold.
+    # An 8-byte digest gives the 16 hex chars we store without truncating.
+    # blake2b is in the standard library and, for items this small, costs less
+    # than the Python around it; another algorithm would change every stored
+    # hash and so force a rewrite of all synced items.
+    h = hashlib.blake2b(digest_size=8)
+    update = h.update
+    update(summary.encode("utf-8"))
+    update(b"|")
+    update(description.encode("utf-8"))
+    update(b"|")
+    update(url.encode("utf-8"))
+    update(b"|")
+    update(location.encode("utf-8"))
+
+    if start is not None:
+        update(b"|start:")
+        update(start.encode("utf-8"))
+    if end is not None:
+        update(b"|end:")
+        update(end.encode("utf-8"))
 
     # Include course_id and type_tag in hash calculation to detect tag changes
-    if item.get("course_id"):
-        content += f"|course_id:{item['course_id']}"
-    if item.get("type_tag"):  # NEW: Include type_tag in hash
-        content += f"|type_tag:{item['type_tag']}"
-
-    return hashlib.md5(content.encode()).hexdigest()[:16]
+    if course_id is not None:
+        update(b"|course_id:")
+        update(course_id.encode("utf-8"))
+    if type_tag is not None:
+        update(b"|type_tag:")
+        update(type_tag.encode("utf-8"))
+
+    return h.hexdigest()
+
+
+def _escape_text(value: str) -> str:
+    """Escape a TEXT property value per RFC 5545."""
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """Fold a content line at 75 octets without splitting UTF-8 sequences."""
+    if len(line) <= _MAX_LINE_OCTETS and line.isascii():
+        return line + "\r\n"
+
+    folded = []
+    current = []
+    size = 0
+    # Continuation lines start with a space, which counts toward their limit
+    limit = _MAX_LINE_OCTETS
+    for char in line:
+        char_size = len(char.encode("utf-8"))
+        if size + char_size > limit:
+            folded.append("".join(current))
+            current = []
+            size = 0
+            limit = _MAX_LINE_OCTETS - 1
+        current.append(char)
+        size += char_size
+    folded.append("".join(current))
+    return "\r\n ".join(folded) + "\r\n"
+
+
+def _text_line(name: str, value: str) -> str:
+    """Render a TEXT property as a folded content line."""
+    return _fold(f"{name}:{_escape_text(value)}")
+
+
+def _dt_line(name: str, value: date) -> str:
+    """Render a DATE or DATE-TIME property as a folded content line."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return _fold(f"{name}:{value:%Y%m%dT%H%M%S}")
+        # A TZID would need a matching VTIMEZONE, which we don't emit, so
+        # other zones are written as the same instant in UTC
+        value = value.astimezone(timezone.utc)
+        return _fold(f"{name}:{value:%Y%m%dT%H%M%S}Z")
+    return _fold(f"{name};VALUE=DATE:{value:%Y%m%d}")
+
+
+def _categories_line(categories: list[str]) -> str:
+    """Render a CATEGORIES property as a folded content line."""
+    return _fold("CATEGORIES:" + ",".join(_escape_text(c) for c in categories))
+
+
+def to_calendar(component: str) -> str:
+    """Wrap a rendered VTODO/VEVENT in a VCALENDAR object.
+
+    The result stays text: caldav stores str data and encodes it once when
+    sending, so handing it bytes would only add a decode.
+    """
+    return _ICAL_PREFIX + component + _ICAL_SUFFIX
+
+
+def task_description(assignment: dict) -> str:
+    """Build a task's DESCRIPTION text, with a link back to Canvas."""
+    description_parts = []
+    if assignment["description"]:
+        description_parts.append(assignment["description"])
+    if assignment["url"]:
+        description_parts.append(f"\nCanvas: {assignment['url']}")
+    return "\n".join(description_parts)
 
 
+@functools.lru_cache(maxsize=4096)
 def create_uid(canvas_uid: str, prefix: str) -> str:
     """Create a unique UID based on Canvas UID."""
     return f"canvas-{prefix}-{canvas_uid}"
 
 
-def assignment_to_vtodo(assignment: dict, content_hash: str) -> tuple[Todo, str]:
-    """Convert a Canvas assignment to a VTODO component."""
-    todo = Todo()
-
+def assignment_to_vtodo(
+    assignment: dict, content_hash: str, now: datetime | None = None
+) -> tuple[str, str]:
+    """Convert a Canvas assignment to a rendered VTODO component."""
     task_uid = create_uid(assignment["uid"], "task")
-    todo.add("uid", task_uid)
-    todo.add("summary", assignment["summary"])
+    lines = ["BEGIN:VTODO\r\n", _text_line("UID", task_uid)]
+    lines.append(_text_line("SUMMARY", assignment["summary"]))
 
     due_date = assignment.get("dtend") or assignment.get("dtstart")
     if due_date:
-        todo.add("due", due_date.dt)
+        lines.append(_dt_line("DUE", due_date.dt))
 
-    description_parts = []
-    if assignment["description"]:
-        description_parts.append(assignment["description"])
-    if assignment["url"]:
-        description_parts.append(f"\nCanvas: {assignment['url']}")
-    if description_parts:
-        todo.add("description", "\n".join(description_parts))
+    if assignment["description_full"]:
+        lines.append(_text_line("DESCRIPTION", assignment["description_full"]))
 
     if assignment["url"]:
-        todo.add("url", assignment["url"])
+        lines.append(_fold(f"URL:{assignment['url']}"))
 
-    now = datetime.now(timezone.utc)
-    todo.add("dtstamp", now)
-    todo.add("created", now)
-    todo.add("last-modified", now)
-    todo.add("status", "NEEDS-ACTION")
-    todo.add("priority", 5)
-    todo.add("x-canvas-hash", content_hash)
+    if now is None:
+        now = datetime.now(timezone.utc)
+    lines.append(_dt_line("DTSTAMP", now))
+    lines.append(_dt_line("CREATED", now))
+    lines.append(_dt_line("LAST-MODIFIED", now))
+    lines.append("STATUS:NEEDS-ACTION\r\n")
+    lines.append("PRIORITY:5\r\n")
+    lines.append(_text_line("X-CANVAS-HASH", content_hash))
 
     # Add course_id and type_tag as CATEGORIES property
     categories = []
     if assignment.get("course_id"):
         categories.append(assignment["course_id"])
-    if assignment.get("type_tag"):  # NEW: Add type_tag to categories
+    if assignment.get("type_tag"):
         categories.append(assignment["type_tag"])
     if categories:
-        todo.add("categories", categories)
+        lines.append(_categories_line(categories))
+
+    lines.append("END:VTODO\r\n")
+    return "".join(lines), task_uid
+
 
-    return todo, task_uid
+def needs_update(existing_component, new_hash: str) -> bool:
+    """Check whether a stored component's Canvas hash differs from the new one."""
+    return str(existing_component.get("X-CANVAS-HASH", "")) != new_hash
 
 
-def update_vtodo(existing_component, assignment: dict, content_hash: str) -> Todo:
-    """Update an existing VTODO component with new data, preserving status."""
-    todo = Todo()
+def update_vtodo(
+    existing_component,
+    assignment: dict,
+    content_hash: str,
+    now: datetime | None = None,
+) -> str | None:
+    """Render an updated VTODO, or return None if the stored hash already matches."""
+    if not needs_update(existing_component, content_hash):
+        return None
+    return _build_update_vtodo(existing_component, assignment, content_hash, now)
 
+
+def _build_update_vtodo(
+    existing_component,
+    assignment: dict,
+    content_hash: str,
+    now: datetime | None = None,
+) -> str:
+    """Render an updated VTODO component from new data, preserving status."""
     task_uid = create_uid(assignment["uid"], "task")
-    todo.add("uid", task_uid)
-    todo.add("summary", assignment["summary"])
+    lines = ["BEGIN:VTODO\r\n", _text_line("UID", task_uid)]
+    lines.append(_text_line("SUMMARY", assignment["summary"]))
 
     due_date = assignment.get("dtend") or assignment.get("dtstart")
     if due_date:
-        todo.add("due", due_date.dt)
+        lines.append(_dt_line("DUE", due_date.dt))
 
-    description_parts = []
-    if assignment["description"]:
-        description_parts.append(assignment["description"])
-    if assignment["url"]:
-        description_parts.append(f"\nCanvas: {assignment['url']}")
-    if description_parts:
-        todo.add("description", "\n".join(description_parts))
+    if assignment["description_full"]:
+        lines.append(_text_line("DESCRIPTION", assignment["description_full"]))
 
     if assignment["url"]:
-        todo.add("url", assignment["url"])
+        lines.append(_fold(f"URL:{assignment['url']}"))
 
-    now = datetime.now(timezone.utc)
-    todo.add("dtstamp", now)
+    if now is None:
+        now = datetime.now(timezone.utc)
+    lines.append(_dt_line("DTSTAMP", now))
 
     original_created = existing_component.get("created")
     if original_created:
-        todo.add("created", original_created.dt)
+        lines.append(_dt_line("CREATED", original_created.dt))
     else:
-        todo.add("created", now)
+        lines.append(_dt_line("CREATED", now))
 
-    todo.add("last-modified", now)
+    lines.append(_dt_line("LAST-MODIFIED", now))
 
     original_status = str(existing_component.get("status", "NEEDS-ACTION"))
-    todo.add("status", original_status)
+    lines.append(_text_line("STATUS", original_status))
 
     original_percent = existing_component.get("percent-complete")
     if original_percent:
-        todo.add("percent-complete", original_percent)
+        lines.append(f"PERCENT-COMPLETE:{int(original_percent)}\r\n")
 
     original_completed = existing_component.get("completed")
     if original_completed:
-        todo.add("completed", original_completed.dt)
+        lines.append(_dt_line("COMPLETED", original_completed.dt))
 
-    todo.add("priority", 5)
-    todo.add("x-canvas-hash", content_hash)
+    lines.append("PRIORITY:5\r\n")
+    lines.append(_text_line("X-CANVAS-HASH", content_hash))
 
     # Add course_id and type_tag as CATEGORIES property
     categories = []
     if assignment.get("course_id"):
         categories.append(assignment["course_id"])
-    if assignment.get("type_tag"):  # NEW: Add type_tag to categories
+    if assignment.get("type_tag"):
         categories.append(assignment["type_tag"])
     if categories:
-        todo.add("categories", categories)
+        lines.append(_categories_line(categories))
 
-    return todo
+    lines.append("END:VTODO\r\n")
+    return "".join(lines)
 
 
-def no_class_to_vevent(item: dict, content_hash: str) -> tuple[Event, str]:
-    """Convert a no-class day to a VEVENT component."""
-    event = Event()
-
+def no_class_to_vevent(
+    item: dict, content_hash: str, now: datetime | None = None
+) -> tuple[str, str]:
+    """Convert a no-class day to a rendered VEVENT component."""
     event_uid = create_uid(item["uid"], "event")
-    event.add("uid", event_uid)
-    event.add("summary", item["summary"])
+    lines = ["BEGIN:VEVENT\r\n", _text_line("UID", event_uid)]
+    lines.append(_text_line("SUMMARY", item["summary"]))
 
     if item.get("dtstart"):
-        event.add("dtstart", item["dtstart"].dt)
+        lines.append(_dt_line("DTSTART", item["dtstart"].dt))
     if item.get("dtend"):
-        event.add("dtend", item["dtend"].dt)
+        lines.append(_dt_line("DTEND", item["dtend"].dt))
 
     if item["description"]:
-        event.add("description", item["description"])
+        lines.append(_text_line("DESCRIPTION", item["description"]))
 
     if item["url"]:
-        event.add("url", item["url"])
+        lines.append(_fold(f"URL:{item['url']}"))
 
-    now = datetime.now(timezone.utc)
-    event.add("dtstamp", now)
-    event.add("created", now)
-    event.add("last-modified", now)
-    event.add("x-canvas-hash", content_hash)
+    if now is None:
+        now = datetime.now(timezone.utc)
+    lines.append(_dt_line("DTSTAMP", now))
+    lines.append(_dt_line("CREATED", now))
+    lines.append(_dt_line("LAST-MODIFIED", now))
+    lines.append(_text_line("X-CANVAS-HASH", content_hash))
 
     # Add course_id as a CATEGORIES property for events as well if desired
     # (type_tag is generally not relevant for 'no class' events, but course_id might be in summary)
-    categories = []
     if item.get("course_id"):
-        categories.append(item["course_id"])
-    if categories:
-        event.add("categories", categories)
+        lines.append(_categories_line([item["course_id"]]))
+
+    lines.append("END:VEVENT\r\n")
+    return "".join(lines), event_uid
 
-    return event, event_uid
 
+def update_vevent(
+    existing_component, item: dict, content_hash: str, now: datetime | None = None
+) -> str | None:
+    """Render an updated VEVENT, or return None if the stored hash already matches."""
+    if not needs_update(existing_component, content_hash):
+        return None
+    return _build_update_vevent(existing_component, item, content_hash, now)
 
-def update_vevent(existing_component, item: dict, content_hash: str) -> Event:
-    """Update an existing VEVENT component with new data."""
-    event = Event()
 
+def _build_update_vevent(
+    existing_component, item: dict, content_hash: str, now: datetime | None = None
+) -> str:
+    """Render an updated VEVENT component from new data."""
     event_uid = create_uid(item["uid"], "event")
-    event.add("uid", event_uid)
-    event.add("summary", item["summary"])
+    lines = ["BEGIN:VEVENT\r\n", _text_line("UID", event_uid)]
+    lines.append(_text_line("SUMMARY", item["summary"]))
 
     if item.get("dtstart"):
-        event.add("dtstart", item["dtstart"].dt)
+        lines.append(_dt_line("DTSTART", item["dtstart"].dt))
     if item.get("dtend"):
-        event.add("dtend", item["dtend"].dt)
+        lines.append(_dt_line("DTEND", item["dtend"].dt))
 
     if item["description"]:
-        event.add("description", item["description"])
+        lines.append(_text_line("DESCRIPTION", item["description"]))
 
     if item["url"]:
-        event.add("url", item["url"])
+        lines.append(_fold(f"URL:{item['url']}"))
 
-    now = datetime.now(timezone.utc)
-    event.add("dtstamp", now)
+    if now is None:
+        now = datetime.now(timezone.utc)
+    lines.append(_dt_line("DTSTAMP", now))
 
     original_created = existing_component.get("created")
     if original_created:
-        event.add("created", original_created.dt)
+        lines.append(_dt_line("CREATED", original_created.dt))
     else:
-        event.add("created", now)
+        lines.append(_dt_line("CREATED", now))
 
-    event.add("last-modified", now)
-    event.add("x-canvas-hash", content_hash)
+    lines.append(_dt_line("LAST-MODIFIED", now))
+    lines.append(_text_line("X-CANVAS-HASH", content_hash))
 
     # Add course_id as a CATEGORIES property for events as well if desired
-    categories = []
     if item.get("course_id"):
-        categories.append(item["course_id"])
-    if categories:
-        event.add("categories", categories)
+        lines.append(_categories_line([item["course_id"]]))
 
-    return event
+    lines.append("END:VEVENT\r\n")
+    return "".join(lines)
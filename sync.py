@@ -1,8 +1,16 @@
 """Sync logic between Canvas and CalDAV."""
 
-from icalendar import Calendar
-
-from caldav_client import get_existing_items
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from caldav_client import (
+    SYNC_STATE_FILE,
+    get_existing_items,
+    load_sync_state,
+    put_item,
+    save_sync_state,
+)
 from ical_helpers import (
     compute_item_hash,
     create_uid,
@@ -10,210 +18,449 @@ from ical_helpers import (
     update_vtodo,
     no_class_to_vevent,
     update_vevent,
+    to_calendar,
 )
 
+WRITE_WORKERS = 8
 
-def detect_changes(existing_component, new_item: dict, item_type: str) -> list[str]:
-    """Detect what changed between existing and new item."""
-    changes = []
+# Changes listed per updated item in the detailed report
+MAX_REPORTED_CHANGES = 3
+
+
+def _text(prop) -> str:
+    """Text of an optional property, empty if it is missing."""
+    return "" if prop is None else str(prop)
+
+
+def _dt_str(prop) -> str:
+    """Date of an optional property; iCal and Canvas values both wrap it in .dt."""
+    if not prop:
+        return "None"
+    # Zoned times are written in UTC, so compare them as UTC too
+    value = prop.dt
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return str(value)
+
+
+def _preview(text: str) -> str:
+    """First 40 characters of text on one line."""
+    return text[:40].replace("\n", " ") if text else "(empty)"
+
+
+# Each field is (iCal key, existing value, new value, change message); values
+# are normalized to strings so the comparison is plain equality
+_TITLE = (
+    "summary",
+    _text,
+    lambda item: item.get("summary", ""),
+    lambda old, new, item: f"Title: '{old[:30]}' → '{new[:30]}'",
+)
+# Tasks compare against the description they are written with, link included
+_TASK_DESCRIPTION = (
+    "description",
+    lambda prop: _text(prop).strip(),
+    lambda item: item["description_full"].strip(),
+    lambda old, new, item: (
+        f"Description: '{_preview(old)}...' → '{_preview(item['description'])}...'"
+    ),
+)
+_EVENT_DESCRIPTION = (
+    "description",
+    lambda prop: _text(prop).strip(),
+    lambda item: item.get("description", "").strip(),
+    lambda old, new, item: f"Description: '{_preview(old)}...' → '{_preview(new)}...'",
+)
+_URL = (
+    "url",
+    _text,
+    lambda item: item.get("url", ""),
+    lambda old, new, item: "URL changed",
+)
+_LOCATION = (
+    "location",
+    _text,
+    lambda item: item.get("location", ""),
+    lambda old, new, item: f"Location: '{old}' → '{new}'",
+)
+
+_TASK_FIELDS = (
+    _TITLE,
+    _TASK_DESCRIPTION,
+    _URL,
+    (
+        "due",
+        _dt_str,
+        lambda item: _dt_str(item.get("dtend") or item.get("dtstart")),
+        lambda old, new, item: f"Due: {old} → {new}",
+    ),
+    _LOCATION,
+)
+
+_EVENT_FIELDS = (
+    _TITLE,
+    _EVENT_DESCRIPTION,
+    _URL,
+    (
+        "dtstart",
+        _dt_str,
+        lambda item: _dt_str(item.get("dtstart")),
+        lambda old, new, item: f"Start: {old} → {new}",
+    ),
+    (
+        "dtend",
+        _dt_str,
+        lambda item: _dt_str(item.get("dtend")),
+        lambda old, new, item: f"End: {old} → {new}",
+    ),
+    _LOCATION,
+)
 
-    # Check summary
-    old_summary = str(existing_component.get("summary", ""))
-    new_summary = new_item.get("summary", "")
-    if old_summary != new_summary:
-        changes.append(f"Title: '{old_summary[:30]}' → '{new_summary[:30]}'")
-
-    # Check description
-    old_desc = str(existing_component.get("description", ""))
-    new_desc = new_item.get("description", "")
-    if new_item.get("url"):
-        new_desc_full = (
-            new_desc + f"\nCanvas: {new_item['url']}"
-            if new_desc
-            else f"\nCanvas: {new_item['url']}"
-        )
-    else:
-        new_desc_full = new_desc
-    if old_desc.strip() != new_desc_full.strip():
-        old_preview = old_desc[:40].replace("\n", " ") if old_desc else "(empty)"
-        new_preview = new_desc[:40].replace("\n", " ") if new_desc else "(empty)"
-        changes.append(f"Description: '{old_preview}...' → '{new_preview}...'")
-
-    # Check URL
-    old_url = str(existing_component.get("url", ""))
-    new_url = new_item.get("url", "")
-    if old_url != new_url:
-        changes.append(f"URL changed")
-
-    # Check dates based on item type
-    if item_type == "task":
-        old_due = existing_component.get("due")
-        new_due = new_item.get("dtend") or new_item.get("dtstart")
-        old_due_str = str(old_due.dt) if old_due else "None"
-        new_due_str = str(new_due.dt) if new_due else "None"
-        if old_due_str != new_due_str:
-            changes.append(f"Due: {old_due_str} → {new_due_str}")
-    else:
-        old_start = existing_component.get("dtstart")
-        new_start = new_item.get("dtstart")
-        old_start_str = str(old_start.dt) if old_start else "None"
-        new_start_str = str(new_start.dt) if new_start else "None"
-        if old_start_str != new_start_str:
-            changes.append(f"Start: {old_start_str} → {new_start_str}")
-
-        old_end = existing_component.get("dtend")
-        new_end = new_item.get("dtend")
-        old_end_str = str(old_end.dt) if old_end else "None"
-        new_end_str = str(new_end.dt) if new_end else "None"
-        if old_end_str != new_end_str:
-            changes.append(f"End: {old_end_str} → {new_end_str}")
-
-    # Check location (for events)
-    old_location = str(existing_component.get("location", ""))
-    new_location = new_item.get("location", "")
-    if old_location != new_location:
-        changes.append(f"Location: '{old_location}' → '{new_location}'")
 
+def detect_changes(
+    existing_component,
+    new_item: dict,
+    item_type: str,
+    limit: int | None = MAX_REPORTED_CHANGES,
+) -> list[str]:
+    """Detect what changed between existing and new item.
+
+    Only the first limit changes are described; "(+more)" marks any beyond.
+    """
+    fields = _TASK_FIELDS if item_type == "task" else _EVENT_FIELDS
+    changes = []
+
+    # Bound once; each lookup otherwise goes through icalendar's CaselessDict
+    get = existing_component.get
+    add_change = changes.append
+    for key, get_old, get_new, describe in fields:
+        old = get_old(get(key))
+        new = get_new(new_item)
+        if old != new:
+            if len(changes) == limit:
+                add_change("(+more)")
+                break
+            add_change(describe(old, new, new_item))
     return changes
 
 
-def sync_to_caldav(assignments: list, no_class_events: list, calendar):
-    """Sync Canvas items to CalDAV."""
+class _Op:
+    """A pending add, update or deletion of one task or event."""
+
+    __slots__ = (
+        "kind",
+        "name",
+        "ical",
+        "existing",
+        "item",
+        "content_hash",
+        "changes",
+        "unchanged",
+        "error",
+    )
+
+    def __init__(
+        self,
+        kind: str,
+        name: str,
+        ical: str | None = None,
+        existing=None,
+        item: dict | None = None,
+        content_hash: str | None = None,
+    ):
+        self.kind = kind
+        self.name = name
+        self.ical = ical  # Rendered up front when adding, in the pool on update
+        self.existing = existing  # Overwritten on update, None when adding
+        self.item = item  # None with an existing item deletes it
+        self.content_hash = content_hash
+        self.changes = None  # Filled in on update when reporting changes
+        self.unchanged = False  # Set when the stored item already matched
+        self.error = None
+
+
+_UPDATERS = {"task": update_vtodo, "event": update_vevent}
+
+
+def _render_update(op: _Op, now: datetime, verbose: bool) -> str | None:
+    """Rebuild an existing item with the op's changes, or None if it matches."""
+    # Loading the component may fetch the item, which is why this runs in the pool
+    component = op.existing.component
+    if component is None:
+        raise ValueError(f"no {op.existing.component_name} in the stored item")
+
+    updated = _UPDATERS[op.kind](component, op.item, op.content_hash, now)
+    if updated is None:
+        return None
+
+    # The hash already decided the update; the diff is only for the report
+    if verbose:
+        op.changes = detect_changes(component, op.item, op.kind)
+    return to_calendar(updated)
+
+
+def _apply_op(calendar, op: _Op, now: datetime, verbose: bool) -> _Op:
+    """Perform one write, recording any failure on the op."""
+    try:
+        if op.existing is None:
+            if op.kind == "task":
+                calendar.save_todo(op.ical)
+            else:
+                calendar.save_event(op.ical)
+        elif op.item is None:
+            op.existing.object.delete()
+        else:
+            op.ical = _render_update(op, now, verbose)
+            if op.ical is None:
+                op.unchanged = True
+            elif not put_item(op.existing, op.ical):
+                # Edited on the server since it was read; rebuild from the
+                # fresh copy so that edit is kept, and retry once
+                op.existing.reload()
+                op.ical = _render_update(op, now, verbose)
+                if op.ical is None:
+                    op.unchanged = True
+                elif not put_item(op.existing, op.ical):
+                    raise RuntimeError("item changed on the server during the update")
+    except Exception as e:
+        op.error = e
+    return op
+
+
+def _run_ops(calendar, ops: list[_Op], now: datetime, verbose: bool) -> list[_Op]:
+    """Apply writes concurrently, returning the ops in their original order."""
+    if not ops:
+        return []
+
+    # Writes are network-bound; executor.map keeps submission order
+    with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as executor:
+        return list(executor.map(lambda op: _apply_op(calendar, op, now, verbose), ops))
+
+
+def _report_ops(ops: list[_Op], log_lines: list[str]) -> tuple[int, int, int, int]:
+    """Log the outcome of applied ops.
+
+    Returns the number of items added, updated, found unchanged and deleted.
+    """
+    added = 0
+    updated = 0
+    unchanged = 0
+    deleted = 0
+    for op in ops:
+        if op.existing is None:
+            if op.error is None:
+                log_lines.append(f"      ✅ Added: {op.name[:40]}")
+                added += 1
+            else:
+                log_lines.append(f"      ❌ Failed: {op.name[:40]} - {op.error}")
+        elif op.item is None:
+            if op.error is None:
+                log_lines.append(f"      🗑️  Deleted: {op.name[:40]}")
+                deleted += 1
+            else:
+                log_lines.append(f"      ❌ Delete failed: {op.name[:40]} - {op.error}")
+        elif op.error is not None:
+            log_lines.append(f"      ❌ Update failed: {op.name[:40]} - {op.error}")
+        elif op.unchanged:
+            log_lines.append(f"      ⏭️  Unchanged: {op.name[:40]}")
+            unchanged += 1
+        else:
+            log_lines.append(f"      🔄 Updated: {op.name[:40]}")
+            updated += 1
+    return added, updated, unchanged, deleted
+
+
+def _removed_uids(existing: dict, wanted: dict, prefix: str) -> list[str]:
+    """UIDs of items this tool created that are no longer in the Canvas feed."""
+    # A section missing from the feed is more likely a bad download than every
+    # item being removed, so nothing of that kind is deleted
+    if not wanted:
+        return []
+
+    # Only UIDs built by create_uid are considered, so other items are left alone
+    own = create_uid("", prefix)
+    return [uid for uid in existing if uid.startswith(own) and uid not in wanted]
+
+
+def _dedupe(items: list, label: str) -> list:
+    """Keep one item per Canvas UID; the last occurrence wins."""
+    unique = list({item["uid"]: item for item in items}.values())
+    if len(unique) < len(items):
+        print(f"   Deduplicated {len(items) - len(unique)} {label}")
+    return unique
+
+
+def _flush(log_lines: list[str]):
+    """Write buffered log lines in one go and clear the buffer."""
+    if log_lines:
+        sys.stdout.write("\n".join(log_lines) + "\n")
+        log_lines.clear()
+
+
+def sync_to_caldav(
+    assignments: list,
+    no_class_events: list,
+    calendar,
+    delete_removed: bool = False,
+    verbose: bool = False,
+    state_path: str = SYNC_STATE_FILE,
+):
+    """Sync Canvas items to CalDAV.
+
+    With delete_removed, synced items no longer in the Canvas feed are deleted.
+    With verbose, a report of what changed in each updated item is printed.
+    Sync tokens and the item index are kept in the file at state_path.
+    """
     print(f"\n🔄 Syncing to CalDAV...")
 
-    existing_todos, existing_events = get_existing_items(calendar)
+    # The same item can appear in more than one course feed
+    assignments = _dedupe(assignments, "assignments")
+    no_class_events = _dedupe(no_class_events, "events")
+
+    # Only changes since the last run are fetched when a sync token was saved
+    sync_state = load_sync_state(state_path)
+    calendar_state = sync_state.setdefault(str(calendar.url), {})
+    existing_todos, existing_events = get_existing_items(calendar, calendar_state)
     print(
         f"   Found {len(existing_todos)} existing tasks, {len(existing_events)} existing events"
     )
 
-    tasks_added = 0
-    tasks_updated = 0
+    # One timestamp for the whole run, so every item shares the same DTSTAMP
+    now = datetime.now(timezone.utc)
+
     tasks_unchanged = 0
-    events_added = 0
-    events_updated = 0
     events_unchanged = 0
 
-    updated_items = []  # Track what was updated and why
-
-    # Sync assignments as tasks
-    print(f"\n   📚 Syncing assignments as tasks...")
-    for assignment in assignments:
-        task_uid = create_uid(assignment["uid"], "task")
-        content_hash = compute_item_hash(assignment)
-
-        if task_uid in existing_todos:
-            existing = existing_todos[task_uid]
-
-            if existing["hash"] == content_hash:
-                print(f"      ⏭️  Unchanged: {assignment['summary'][:40]}")
-                tasks_unchanged += 1
-                continue
+    # Writes are collected from both sections and then sent concurrently
+    task_ops = []
+    event_ops = []
 
-            changes = detect_changes(existing["component"], assignment, "task")
-            print(f"      🔄 Updating: {assignment['summary'][:40]}")
-
-            updated_items.append(
-                {"type": "Task", "name": assignment["summary"], "changes": changes}
-            )
+    # Sync assignments as tasks; per-item output is buffered per section and
+    # written once after the writes, keeping stdout out of the loops
+    task_lines = [f"\n   📚 Syncing assignments as tasks..."]
 
-            updated_todo = update_vtodo(existing["component"], assignment, content_hash)
+    # Three-way diff by UID: on both sides, new in Canvas, and gone from Canvas
+    tasks = {create_uid(a["uid"], "task"): a for a in assignments}
+    known_tasks = [uid for uid in tasks if uid in existing_todos]
+    new_tasks = [uid for uid in tasks if uid not in existing_todos]
+    removed_tasks = (
+        _removed_uids(existing_todos, tasks, "task") if delete_removed else []
+    )
 
-            cal = Calendar()
-            cal.add("prodid", "-//Canvas Task Sync//EN")
-            cal.add("version", "2.0")
-            cal.add_component(updated_todo)
+    for task_uid in known_tasks:
+        assignment = tasks[task_uid]
+        existing = existing_todos[task_uid]
+        content_hash = compute_item_hash(assignment)
 
-            try:
-                existing["object"].delete()
-                calendar.save_todo(cal.to_ical().decode("utf-8"))
-                tasks_updated += 1
-            except Exception as e:
-                print(f"      ❌ Update failed: {assignment['summary'][:40]} - {e}")
+        # The saved hash is all an unchanged item needs, so nothing is parsed
+        # or rendered for it
+        if existing.hash == content_hash:
+            task_lines.append(f"      ⏭️  Unchanged: {assignment['summary'][:40]}")
+            tasks_unchanged += 1
             continue
 
-        todo, _ = assignment_to_vtodo(assignment, content_hash)
+        # The stored item is loaded and rebuilt in the write pool
+        task_ops.append(
+            _Op(
+                "task",
+                assignment["summary"],
+                existing=existing,
+                item=assignment,
+                content_hash=content_hash,
+            )
+        )
 
-        cal = Calendar()
-        cal.add("prodid", "-//Canvas Task Sync//EN")
-        cal.add("version", "2.0")
-        cal.add_component(todo)
+    for task_uid in new_tasks:
+        assignment = tasks[task_uid]
+        content_hash = compute_item_hash(assignment)
+        todo, _ = assignment_to_vtodo(assignment, content_hash, now)
+        task_ops.append(_Op("task", assignment["summary"], to_calendar(todo)))
 
-        try:
-            calendar.save_todo(cal.to_ical().decode("utf-8"))
-            print(f"      ✅ Added: {assignment['summary'][:40]}")
-            tasks_added += 1
-        except Exception as e:
-            print(f"      ❌ Failed: {assignment['summary'][:40]} - {e}")
+    for task_uid in removed_tasks:
+        task_ops.append(_Op("task", task_uid, existing=existing_todos[task_uid]))
 
     # Sync no-class days as events
-    print(f"\n   🏖️  Syncing no-class days as events...")
-    for item in no_class_events:
-        event_uid = create_uid(item["uid"], "event")
-        content_hash = compute_item_hash(item)
+    event_lines = [f"\n   🏖️  Syncing no-class days as events..."]
 
-        if event_uid in existing_events:
-            existing = existing_events[event_uid]
+    events = {create_uid(item["uid"], "event"): item for item in no_class_events}
+    known_events = [uid for uid in events if uid in existing_events]
+    new_events = [uid for uid in events if uid not in existing_events]
+    removed_events = (
+        _removed_uids(existing_events, events, "event") if delete_removed else []
+    )
 
-            if existing["hash"] == content_hash:
-                print(f"      ⏭️  Unchanged: {item['summary'][:40]}")
-                events_unchanged += 1
-                continue
+    for event_uid in known_events:
+        item = events[event_uid]
+        existing = existing_events[event_uid]
+        content_hash = compute_item_hash(item)
 
-            changes = detect_changes(existing["component"], item, "event")
-            print(f"      🔄 Updating: {item['summary'][:40]}")
+        if existing.hash == content_hash:
+            event_lines.append(f"      ⏭️  Unchanged: {item['summary'][:40]}")
+            events_unchanged += 1
+            continue
 
-            updated_items.append(
-                {"type": "Event", "name": item["summary"], "changes": changes}
+        # The stored item is loaded and rebuilt in the write pool
+        event_ops.append(
+            _Op(
+                "event",
+                item["summary"],
+                existing=existing,
+                item=item,
+                content_hash=content_hash,
             )
+        )
 
-            updated_event = update_vevent(existing["component"], item, content_hash)
-
-            cal = Calendar()
-            cal.add("prodid", "-//Canvas Task Sync//EN")
-            cal.add("version", "2.0")
-            cal.add_component(updated_event)
-
-            try:
-                existing["object"].delete()
-                calendar.save_event(cal.to_ical().decode("utf-8"))
-                events_updated += 1
-            except Exception as e:
-                print(f"      ❌ Update failed: {item['summary'][:40]} - {e}")
-            continue
+    for event_uid in new_events:
+        item = events[event_uid]
+        content_hash = compute_item_hash(item)
+        event, _ = no_class_to_vevent(item, content_hash, now)
+        event_ops.append(_Op("event", item["summary"], to_calendar(event)))
 
-        event, _ = no_class_to_vevent(item, content_hash)
+    for event_uid in removed_events:
+        event_ops.append(_Op("event", event_uid, existing=existing_events[event_uid]))
 
-        cal = Calendar()
-        cal.add("prodid", "-//Canvas Task Sync//EN")
-        cal.add("version", "2.0")
-        cal.add_component(event)
+    # Tasks and events share one pool, so neither section waits on the other
+    results = _run_ops(calendar, task_ops + event_ops, now, verbose)
+    tasks_added, tasks_updated, tasks_rechecked, tasks_deleted = _report_ops(
+        results[: len(task_ops)], task_lines
+    )
+    events_added, events_updated, events_rechecked, events_deleted = _report_ops(
+        results[len(task_ops) :], event_lines
+    )
+    tasks_unchanged += tasks_rechecked
+    events_unchanged += events_rechecked
+    _flush(task_lines)
+    _flush(event_lines)
 
-        try:
-            calendar.save_event(cal.to_ical().decode("utf-8"))
-            print(f"      ✅ Added: {item['summary'][:40]}")
-            events_added += 1
-        except Exception as e:
-            print(f"      ❌ Failed: {item['summary'][:40]} - {e}")
+    updated_items = [
+        {"type": op.kind.capitalize(), "name": op.name, "changes": op.changes}
+        for op in results
+        if op.changes is not None and not op.unchanged and op.error is None
+    ]
 
     # Print detailed changes section
     if updated_items:
-        print(f"\n{'='*70}")
-        print(f"📝 DETAILED CHANGES ({len(updated_items)} items updated)")
-        print(f"{'='*70}")
+        log_lines = [f"\n{'='*70}"]
+        log_lines.append(f"📝 DETAILED CHANGES ({len(updated_items)} items updated)")
+        log_lines.append(f"{'='*70}")
         for item in updated_items:
-            print(f"\n   🔄 [{item['type']}] {item['name'][:50]}")
+            log_lines.append(f"\n   🔄 [{item['type']}] {item['name'][:50]}")
             if item["changes"]:
                 for change in item["changes"]:
-                    print(f"      • {change}")
+                    log_lines.append(f"      • {change}")
             else:
-                print(f"      • (metadata change only)")
+                log_lines.append(f"      • (metadata change only)")
+        _flush(log_lines)
+
+    save_sync_state(sync_state, state_path)
 
     print(f"\n{'='*70}")
     print(f"📊 SUMMARY")
     print(f"{'='*70}")
-    print(
-        f"   Tasks:  {tasks_added} added, {tasks_updated} updated, {tasks_unchanged} unchanged"
-    )
-    print(
-        f"   Events: {events_added} added, {events_updated} updated, {events_unchanged} unchanged"
-    )
+    tasks_line = f"   Tasks:  {tasks_added} added, {tasks_updated} updated, {tasks_unchanged} unchanged"
+    events_line = f"   Events: {events_added} added, {events_updated} updated, {events_unchanged} unchanged"
+    if delete_removed:
+        tasks_line += f", {tasks_deleted} deleted"
+        events_line += f", {events_deleted} deleted"
+    print(tasks_line)
+    print(events_line)
@@ -1,27 +1,97 @@
+import json
 import requests
-from icalendar import Calendar
+from icalendar import Event
 import datetime
 
+# Feed bodies with their ETag/Last-Modified validators, keyed by URL
+FEED_CACHE_FILE = ".feedcache.json"
 
-# The fetch_calendar_data and parse_calendar_data functions remain the same
+FEED_TIMEOUT = 30  # seconds
+
+
+def load_feed_cache():
+    """Loads cached feed bodies and validators."""
+    try:
+        with open(FEED_CACHE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_feed_cache(cache):
+    """Saves cached feed bodies and validators."""
+    with open(FEED_CACHE_FILE, "w") as f:
+        json.dump(cache, f)
+
+
+def _caching_lines(lines, cache, url, headers):
+    """Passes lines through, caching the full body once it has been read."""
+    body = []
+    for line in lines:
+        body.append(line)
+        yield line
+
+    etag = headers.get("ETag")
+    last_modified = headers.get("Last-Modified")
+    if etag or last_modified:
+        cache[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "body": "\n".join(body),
+        }
+        save_feed_cache(cache)
+
+
+# The feed is streamed and parsed one event at a time, so the whole calendar
+# is never held in memory as a single tree
 def fetch_calendar_data(url):
-    """Fetches iCalendar data from the given URL."""
+    """Fetches iCalendar data from the given URL as an iterator of lines."""
+    # A conditional request turns an unchanged feed into a bodyless 304
+    cache = load_feed_cache()
+    cached = cache.get(url)
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
     try:
-        response = requests.get(url)
+        response = requests.get(url, headers=headers, stream=True, timeout=FEED_TIMEOUT)
         response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
-        return response.text
     except requests.exceptions.RequestException as e:
         print(f"Error fetching calendar data from {url}: {e}")
         return None
 
-
-def parse_calendar_data(ics_content):
-    """Parses iCalendar content and returns a Calendar object."""
-    try:
-        return Calendar.from_ical(ics_content)
-    except Exception as e:
-        print(f"Error parsing iCalendar data: {e}")
-        return None
+    if response.status_code == 304 and cached:
+        print("Calendar feed unchanged, using cached copy.")
+        return iter(cached["body"].splitlines())
+
+    response.encoding = "utf-8"  # iCalendar's default charset (RFC 5545)
+    return _caching_lines(
+        response.iter_lines(decode_unicode=True), cache, url, response.headers
+    )
+
+
+def iter_vevents(lines):
+    """Yields each VEVENT found in a stream of iCalendar lines as an Event."""
+    block = None
+    for line in lines:
+        if not line:
+            continue
+        if block is None:
+            if line == "BEGIN:VEVENT":
+                block = [line]
+            continue
+
+        # Folded continuation lines are kept as-is; icalendar unfolds them
+        block.append(line)
+        if line == "END:VEVENT":
+            try:
+                yield Event.from_ical("\r\n".join(block) + "\r\n")
+            except Exception as e:
+                print(f"Error parsing iCalendar event: {e}")
+            block = None
 
 
 def display_event_details_comprehensive(event):
@@ -62,9 +132,10 @@ def display_event_details_comprehensive(event):
 
         # Check for and display parameters associated with this property
         # Parameters are stored in the `.params` attribute of a Property object
-        if hasattr(prop_value, "params") and prop_value.params:
+        params = getattr(prop_value, "params", None)
+        if params:
             print("    Parameters:")
-            for param_name, param_values in prop_value.params.items():
+            for param_name, param_values in params.items():
                 # Parameters can sometimes be lists (e.g., CATEGORIES: A,B,C)
                 if isinstance(param_values, list):
                     print(
@@ -81,23 +152,28 @@ def main():
     # Ensure this URL is correct for your specific Canvas calendar feed.
     calendar_url = "https://utahtech.instructure.com/feeds/calendars/user_fLZ4F8kSwFwArS85XptkSqtdQ5SsoSbN4CFqfl4R.ics"
 
-    ics_content = fetch_calendar_data(calendar_url)
-    if not ics_content:
+    lines = fetch_calendar_data(calendar_url)
+    if lines is None:
         return
 
-    cal = parse_calendar_data(ics_content)
-    if not cal:
+    # Only VEVENT blocks are parsed; everything else in the feed is skipped.
+    # The body is still downloading here, so network errors can surface too
+    try:
+        events = list(iter_vevents(lines))
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching calendar data from {calendar_url}: {e}")
         return
 
-    # Filter for VEVENT components. cal.walk() iterates through all components.
-    events = [component for component in cal.walk("vevent")]
-
     if not events:
         print("No events found in the calendar.")
         return
 
     print(f"Found {len(events)} events.")
-    print("---------------------\n")
+
+    # The listing is rendered once and reprinted from these strings; titles are
+    # indexed so an event can also be picked by name
+    listing_strs = []
+    events_by_summary = {}
     for i, event in enumerate(events):
         summary = str(
             event.get("summary", "No Summary")
@@ -115,14 +191,18 @@ def main():
                 start_str = dt_object.isoformat() + " (All Day)"
             # If it's some other unexpected type, start_str remains 'N/A'
 
-        print(f"{i+1}. {summary} (Starts: {start_str})")
-    print("\n---------------------\n")
+        listing_strs.append(f"{i+1}. {summary} (Starts: {start_str})")
+        events_by_summary.setdefault(summary.lower(), event)
+
+    listing = "---------------------\n\n" + "\n".join(listing_strs)
+    listing += "\n\n---------------------\n"
+    print(listing)
 
     while True:
         try:
             choice = (
                 input(
-                    f"Enter the number of the event you want to view (1-{len(events)}), or 'q' to quit: "
+                    f"Enter the number (1-{len(events)}) or title of the event you want to view, 'l' to list again, or 'q' to quit: "
                 )
                 .strip()
                 .lower()
@@ -130,22 +210,29 @@ def main():
 
             if choice == "q":
                 break
+            if choice == "l":
+                print(listing)
+                continue
+
+            event = events_by_summary.get(choice)
+            if event is None:
+                event_index = int(choice) - 1  # Convert to 0-based index
+                if not 0 <= event_index < len(events):
+                    print(
+                        f"Invalid event number. Please enter a number between 1 and {len(events)}."
+                    )
+                    continue
+                event = events[event_index]
 
-            event_index = int(choice) - 1  # Convert to 0-based index
-            if 0 <= event_index < len(events):
-                # Call the new comprehensive display function
-                display_event_details_comprehensive(events[event_index])
+            # Call the new comprehensive display function
+            display_event_details_comprehensive(event)
 
-                # Ask if they want to view another event or quit
-                cont = input("View another event? (y/n): ").strip().lower()
-                if cont != "y":
-                    break
-            else:
-                print(
-                    f"Invalid event number. Please enter a number between 1 and {len(events)}."
-                )
+            # Ask if they want to view another event or quit
+            cont = input("View another event? (y/n): ").strip().lower()
+            if cont != "y":
+                break
         except ValueError:
-            print("Invalid input. Please enter a number or 'q'.")
+            print("Invalid input. Please enter a number, an event title, or 'q'.")
 
 
 if __name__ == "__main__":
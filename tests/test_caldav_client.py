@@ -0,0 +1,326 @@
+"""Tests for how caldav_client works out which items exist on the server."""
+
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from types import SimpleNamespace
+
+import caldav
+from icalendar import Calendar
+
+import caldav_client
+
+CALENDAR_URL = "https://dav.example.com/cal/"
+CALENDAR_DATA = "{urn:ietf:params:xml:ns:caldav}calendar-data"
+ETAG = "{DAV:}getetag"
+
+
+def _ical(component_name: str, uid: str, content_hash: str = "h1") -> str:
+    """A minimal stored resource for one task or event."""
+    return (
+        "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//x//EN\r\n"
+        f"BEGIN:{component_name}\r\nUID:{uid}\r\n"
+        f"X-CANVAS-HASH:{content_hash}\r\n"
+        f"END:{component_name}\r\nEND:VCALENDAR\r\n"
+    )
+
+
+class FakeCalendar:
+    """Just enough of a caldav Calendar and its client for the lookups."""
+
+    def __init__(self, report_status: int = 207, report_results: dict | None = None):
+        self.url = caldav.lib.url.URL.objectify(CALENDAR_URL)
+        self.client = SimpleNamespace(url=self.url, report=self._report)
+        self.report_status = report_status
+        self.report_results = report_results or {}
+        self.listed = []
+        self.changed = []
+        self.sync_token = "token-2"
+
+    def objects_by_sync_token(
+        self, sync_token=None, load_objects=False, disable_fallback=False
+    ):
+        if sync_token != "token-1":
+            raise caldav.error.ReportError("unknown sync token")
+        return SimpleNamespace(objects=self.changed, sync_token=self.sync_token)
+
+    def _report(self, url, body, depth=0):
+        results = {href: dict(props) for href, props in self.report_results.items()}
+        return SimpleNamespace(
+            status=self.report_status,
+            reason="reason",
+            expand_simple_props=lambda props: results,
+        )
+
+    def todos(self, include_completed=False):
+        return [
+            SimpleNamespace(data=data, url=f"{CALENDAR_URL}{uid}.ics")
+            for uid, data in self.listed
+            if "BEGIN:VTODO" in data
+        ]
+
+    def events(self):
+        return [
+            SimpleNamespace(data=data, url=f"{CALENDAR_URL}{uid}.ics")
+            for uid, data in self.listed
+            if "BEGIN:VEVENT" in data
+        ]
+
+
+class ChangedResource:
+    """A resource reported by a sync REPORT; data None means it was deleted."""
+
+    def __init__(self, href: str, data: str | None, etag: str | None = None):
+        self.url = f"{CALENDAR_URL}{href}"
+        self.data = None
+        self.props = {}
+        self._data = data
+        self._etag = etag
+
+    def load(self):
+        if self._data is None:
+            raise caldav.error.NotFoundError(self.url)
+        self.data = self._data
+        if self._etag:
+            self.props[ETAG] = self._etag
+        return self
+
+
+def _saved_state() -> dict:
+    """Sync state saved by an earlier run, holding two tasks and an event."""
+    return {
+        "token": "token-1",
+        "items": {
+            f"{CALENDAR_URL}kept.ics": {
+                "uid": "canvas-task-kept",
+                "hash": "h1",
+                "component": "VTODO",
+                "etag": '"kept-1"',
+            },
+            f"{CALENDAR_URL}gone.ics": {
+                "uid": "canvas-task-gone",
+                "hash": "h1",
+                "component": "VTODO",
+                "etag": '"gone-1"',
+            },
+            f"{CALENDAR_URL}event.ics": {
+                "uid": "canvas-event-1",
+                "hash": "h1",
+                "component": "VEVENT",
+                "etag": '"event-1"',
+            },
+        },
+    }
+
+
+class SyncChangesTest(unittest.TestCase):
+    def _sync(self, calendar, state):
+        with redirect_stdout(io.StringIO()):
+            return caldav_client.get_existing_items(calendar, state)
+
+    def test_unchanged_items_come_from_the_index(self):
+        calendar = FakeCalendar()
+        state = _saved_state()
+        todos, events = self._sync(calendar, state)
+
+        kept = todos["canvas-task-kept"]
+        self.assertEqual(kept.hash, "h1")
+        self.assertEqual(kept.etag, '"kept-1"')
+        self.assertIsInstance(kept.object, caldav.Todo)
+        self.assertEqual(str(kept.object.url), f"{CALENDAR_URL}kept.ics")
+        self.assertIsInstance(events["canvas-event-1"].object, caldav.Event)
+        self.assertEqual(state["token"], "token-2")
+
+    def test_deleted_hrefs_are_dropped(self):
+        calendar = FakeCalendar()
+        calendar.changed = [ChangedResource("gone.ics", None)]
+        state = _saved_state()
+        todos, _ = self._sync(calendar, state)
+
+        self.assertNotIn("canvas-task-gone", todos)
+        self.assertNotIn(f"{CALENDAR_URL}gone.ics", state["items"])
+        self.assertIn("canvas-task-kept", todos)
+
+    def test_changed_hrefs_are_reindexed(self):
+        calendar = FakeCalendar()
+        calendar.changed = [
+            ChangedResource(
+                "kept.ics", _ical("VTODO", "canvas-task-kept", "h2"), '"kept-2"'
+            ),
+            ChangedResource("new.ics", _ical("VEVENT", "canvas-event-new"), '"new-1"'),
+        ]
+        state = _saved_state()
+        todos, events = self._sync(calendar, state)
+
+        self.assertEqual(todos["canvas-task-kept"].hash, "h2")
+        self.assertEqual(todos["canvas-task-kept"].etag, '"kept-2"')
+        self.assertEqual(events["canvas-event-new"].hash, "h1")
+        self.assertEqual(
+            state["items"][f"{CALENDAR_URL}kept.ics"],
+            {
+                "uid": "canvas-task-kept",
+                "hash": "h2",
+                "component": "VTODO",
+                "etag": '"kept-2"',
+            },
+        )
+        self.assertEqual(
+            state["items"][f"{CALENDAR_URL}new.ics"]["component"], "VEVENT"
+        )
+
+    def test_rejected_token_falls_back_to_a_full_query(self):
+        calendar = FakeCalendar(
+            report_results={
+                "/cal/": {},
+                "/cal/t.ics": {CALENDAR_DATA: _ical("VTODO", "canvas-task-1")},
+            }
+        )
+        state = _saved_state()
+        state["token"] = "expired"
+        todos, _ = self._sync(calendar, state)
+
+        self.assertEqual(list(todos), ["canvas-task-1"])
+        self.assertNotIn("token", state)
+
+
+class SyncStateFileTest(unittest.TestCase):
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "state.json")
+            caldav_client.save_sync_state(_saved_state(), path)
+            self.assertEqual(caldav_client.load_sync_state(path), _saved_state())
+
+    def test_unwritable_path_only_warns(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "missing", "state.json")
+            with redirect_stdout(io.StringIO()) as output:
+                caldav_client.save_sync_state(_saved_state(), path)
+            self.assertIn("Could not save sync state", output.getvalue())
+            self.assertEqual(caldav_client.load_sync_state(path), {})
+
+
+def _wrap(component_name: str, body: str, newline: str = "\r\n") -> str:
+    """Wrap content lines in a resource, using the given line endings."""
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"BEGIN:{component_name}",
+        *body.split("\n"),
+        f"END:{component_name}",
+        "END:VCALENDAR",
+        "",
+    ]
+    return newline.join(lines)
+
+
+# Resource bodies with the (UID, hash) the scanner should read, or None where
+# it has to hand over to icalendar
+SCAN_CASES = {
+    "plain": ("UID:canvas-task-1\nX-CANVAS-HASH:h1", ("canvas-task-1", "h1")),
+    "folded uid": (
+        "UID:canvas-task-with-a-very-\n long-uid\nX-CANVAS-HASH:h1",
+        ("canvas-task-with-a-very-long-uid", "h1"),
+    ),
+    "uid parameter": (
+        "UID;X-PARAM=value:canvas-task-1\nX-CANVAS-HASH:h1",
+        ("canvas-task-1", "h1"),
+    ),
+    "escaped uid": ("UID:canvas-task-1\\,2\nX-CANVAS-HASH:h1", None),
+    "alarm with uid": (
+        "UID:canvas-task-1\nX-CANVAS-HASH:h1\nBEGIN:VALARM\nUID:alarm-1\n"
+        "ACTION:DISPLAY\nTRIGGER:-PT15M\nEND:VALARM",
+        None,
+    ),
+    "missing hash": ("UID:canvas-task-1\nSUMMARY:Lab", ("canvas-task-1", "")),
+}
+
+
+class ScanUidAndHashTest(unittest.TestCase):
+    def test_scan_cases(self):
+        for newline in ("\r\n", "\n"):
+            for name, (body, expected) in SCAN_CASES.items():
+                with self.subTest(name=name, newline=repr(newline)):
+                    data = _wrap("VTODO", body, newline)
+                    scanned = caldav_client._scan_uid_and_hash(data, "VTODO")
+                    self.assertEqual(scanned, expected)
+
+    def test_scan_agrees_with_icalendar(self):
+        for newline in ("\r\n", "\n"):
+            for name, (body, _) in SCAN_CASES.items():
+                with self.subTest(name=name, newline=repr(newline)):
+                    data = _wrap("VTODO", body, newline)
+                    component = Calendar.from_ical(data).walk("VTODO")[0]
+                    parsed = (
+                        str(component.get("UID")),
+                        str(component.get("X-CANVAS-HASH", "")),
+                    )
+                    uid, item = caldav_client._parse_resource(None, data, "VTODO")
+                    self.assertEqual((uid, item.hash), parsed)
+
+                    scanned = caldav_client._scan_uid_and_hash(data, "VTODO")
+                    if scanned is not None:
+                        self.assertEqual(scanned, parsed)
+
+    def test_other_component_type(self):
+        data = _wrap("VEVENT", "UID:canvas-event-1\nX-CANVAS-HASH:h1")
+        self.assertIsNone(caldav_client._scan_uid_and_hash(data, "VTODO"))
+        self.assertIsNone(caldav_client._parse_resource(None, data, "VTODO"))
+        self.assertEqual(
+            caldav_client._parse_any(None, data)[:2], ("VEVENT", "canvas-event-1")
+        )
+
+
+class QueryExistingTest(unittest.TestCase):
+    def test_reads_hashes_and_etags(self):
+        calendar = FakeCalendar(
+            report_results={
+                "/cal/": {},
+                "/cal/t.ics": {
+                    CALENDAR_DATA: _ical("VTODO", "canvas-task-1"),
+                    ETAG: '"e1"',
+                },
+                "/cal/e.ics": {CALENDAR_DATA: _ical("VEVENT", "canvas-event-2", "h2")},
+            }
+        )
+        todos, events = caldav_client._query_existing(calendar)
+
+        self.assertEqual(list(todos), ["canvas-task-1"])
+        self.assertEqual(todos["canvas-task-1"].hash, "h1")
+        self.assertEqual(todos["canvas-task-1"].etag, '"e1"')
+        self.assertEqual(events["canvas-event-2"].hash, "h2")
+        self.assertIsNone(events["canvas-event-2"].etag)
+
+    def test_error_status_raises(self):
+        calendar = FakeCalendar(report_status=403)
+        with self.assertRaises(caldav.error.ReportError):
+            caldav_client._query_existing(calendar)
+
+    def test_missing_calendar_data_raises(self):
+        # A server refusing the partial request answers the property with 404
+        calendar = FakeCalendar(
+            report_results={
+                "/cal/": {},
+                "/cal/t.ics": {CALENDAR_DATA: None, ETAG: '"e1"'},
+            }
+        )
+        with self.assertRaises(caldav.error.ReportError):
+            caldav_client._query_existing(calendar)
+
+    def test_failed_query_falls_back_to_listing(self):
+        calendar = FakeCalendar(report_status=500)
+        calendar.listed = [
+            ("t", _ical("VTODO", "canvas-task-1")),
+            ("e", _ical("VEVENT", "canvas-event-2")),
+        ]
+        with redirect_stdout(io.StringIO()) as output:
+            todos, events = caldav_client.get_existing_items(calendar)
+
+        self.assertIn("Partial calendar query failed", output.getvalue())
+        self.assertEqual(list(todos), ["canvas-task-1"])
+        self.assertEqual(list(events), ["canvas-event-2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
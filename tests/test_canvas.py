@@ -0,0 +1,52 @@
+"""Tests for keyword matching in canvas."""
+
+import random
+import re
+import unittest
+
+from canvas import _contains_word
+
+
+def _regex_contains_word(text: str, word: str) -> bool:
+    """The regex check _contains_word replaced."""
+    return re.search(rf"\b{re.escape(word)}\b", text) is not None
+
+
+class ContainsWordTest(unittest.TestCase):
+    def test_word_boundaries(self):
+        cases = [
+            ("label the diagram", "lab", False),
+            ("lab 3 report", "lab", True),
+            ("lab_1 setup", "lab", False),
+            ("lab's due date", "lab", True),
+            ("read before lab", "lab", True),
+            ("lab", "lab", True),
+            ("collaborate", "lab", False),
+            ("pre-lab quiz", "lab", True),
+            ("lab2", "lab", False),
+            ("case study: ch 4", "case study", True),
+            ("final exam review", "exam", True),
+            ("examine the logs", "exam", False),
+            ("", "lab", False),
+        ]
+        for text, word, expected in cases:
+            with self.subTest(text=text, word=word):
+                self.assertEqual(_contains_word(text, word), expected)
+                self.assertEqual(_regex_contains_word(text, word), expected)
+
+    def test_matches_regex_on_random_summaries(self):
+        rng = random.Random(1234)
+        alphabet = "labexmquiz _-'.:9é"
+        words = ["lab", "exam", "quiz", "case study"]
+        for _ in range(2000):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+            for word in words:
+                self.assertEqual(
+                    _contains_word(text, word),
+                    _regex_contains_word(text, word),
+                    (text, word),
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,242 @@
+"""Round-trip tests for the hand-written iCalendar rendering in ical_helpers."""
+
+import unittest
+from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo
+
+from icalendar import Calendar, Event, Todo, vDDDTypes
+
+from ical_helpers import (
+    assignment_to_vtodo,
+    create_uid,
+    no_class_to_vevent,
+    task_description,
+    to_calendar,
+    update_vevent,
+    update_vtodo,
+)
+
+NOW = datetime(2025, 3, 4, 5, 6, 7, tzinfo=timezone.utc)
+
+TRICKY_TEXT = 'Lab 1, part A; see C:\\labs\\1\nthen "submit"'
+LONG_UNICODE = "Ünïcödé ✓ 日本語のテキスト " * 8
+
+
+def _item(**fields) -> dict:
+    """A Canvas item as canvas.classify_items builds it."""
+    item = {
+        "uid": "event-assignment-1",
+        "summary": "Homework 1",
+        "description": "Read chapter 2",
+        "url": "https://canvas.example.edu/courses/9/assignments/1",
+        "location": "",
+        "dtstart": vDDDTypes(datetime(2025, 3, 10, 23, 59, tzinfo=timezone.utc)),
+        "dtend": None,
+        "course_id": "IT-3150",
+        "type_tag": "HW",
+    }
+    item.update(fields)
+    item["description_full"] = task_description(item)
+    return item
+
+
+def _old_vtodo(assignment: dict, content_hash: str, existing=None) -> Todo:
+    """Build a VTODO the way ical_helpers did with icalendar before rendering text."""
+    todo = Todo()
+    todo.add("uid", create_uid(assignment["uid"], "task"))
+    todo.add("summary", assignment["summary"])
+
+    due_date = assignment.get("dtend") or assignment.get("dtstart")
+    if due_date:
+        todo.add("due", due_date.dt)
+    if assignment["description_full"]:
+        todo.add("description", assignment["description_full"])
+    if assignment["url"]:
+        todo.add("url", assignment["url"])
+
+    todo.add("dtstamp", NOW)
+    if existing is None:
+        todo.add("created", NOW)
+        todo.add("last-modified", NOW)
+        todo.add("status", "NEEDS-ACTION")
+    else:
+        original_created = existing.get("created")
+        todo.add("created", original_created.dt if original_created else NOW)
+        todo.add("last-modified", NOW)
+        todo.add("status", str(existing.get("status", "NEEDS-ACTION")))
+        if existing.get("percent-complete"):
+            todo.add("percent-complete", existing.get("percent-complete"))
+        if existing.get("completed"):
+            todo.add("completed", existing.get("completed").dt)
+
+    todo.add("priority", 5)
+    todo.add("x-canvas-hash", content_hash)
+    categories = [c for c in (assignment["course_id"], assignment["type_tag"]) if c]
+    if categories:
+        todo.add("categories", categories)
+    return todo
+
+
+def _old_vevent(item: dict, content_hash: str, existing=None) -> Event:
+    """Build a VEVENT the way ical_helpers did with icalendar before rendering text."""
+    event = Event()
+    event.add("uid", create_uid(item["uid"], "event"))
+    event.add("summary", item["summary"])
+    if item.get("dtstart"):
+        event.add("dtstart", item["dtstart"].dt)
+    if item.get("dtend"):
+        event.add("dtend", item["dtend"].dt)
+    if item["description"]:
+        event.add("description", item["description"])
+    if item["url"]:
+        event.add("url", item["url"])
+
+    event.add("dtstamp", NOW)
+    original_created = existing.get("created") if existing is not None else None
+    event.add("created", original_created.dt if original_created else NOW)
+    event.add("last-modified", NOW)
+    event.add("x-canvas-hash", content_hash)
+    if item["course_id"]:
+        event.add("categories", [item["course_id"]])
+    return event
+
+
+def _parse(ical: str | bytes, component_name: str):
+    """Parse a VCALENDAR and return its single component of the given type."""
+    return Calendar.from_ical(ical).walk(component_name)[0]
+
+
+def _old_calendar(component) -> str:
+    """Serialize an icalendar component the way the old code sent it."""
+    calendar = Calendar()
+    calendar.add("prodid", "-//Canvas Task Sync//EN")
+    calendar.add("version", "2.0")
+    calendar.add_component(component)
+    return calendar.to_ical().decode("utf-8")
+
+
+def _line(ical: str, name: str) -> str | None:
+    """The unfolded content line for a property, if present."""
+    for line in ical.replace("\r\n ", "").split("\r\n"):
+        if line.startswith(f"{name}:") or line.startswith(f"{name};"):
+            return line
+    return None
+
+
+def _properties(component) -> dict:
+    """Decoded property values, comparable across both renderings."""
+    values = {}
+    for name, value in component.items():
+        if hasattr(value, "dt"):
+            values[name] = value.dt
+        elif hasattr(value, "cats"):
+            values[name] = list(value.cats)
+        else:
+            values[name] = str(value)
+    return values
+
+
+class RenderRoundTripTest(unittest.TestCase):
+    def assertSameTodo(self, rendered: str, expected: Todo):
+        parsed = _parse(to_calendar(rendered), "VTODO")
+        old = _parse(_old_calendar(expected), "VTODO")
+        self.assertEqual(_properties(parsed), _properties(old))
+
+    def assertSameEvent(self, rendered: str, expected: Event):
+        parsed = _parse(to_calendar(rendered), "VEVENT")
+        old = _parse(_old_calendar(expected), "VEVENT")
+        self.assertEqual(_properties(parsed), _properties(old))
+
+    def assertFolded(self, ical: str):
+        for line in ical.split("\r\n"):
+            self.assertLessEqual(len(line.encode("utf-8")), 75, line)
+
+    def test_escaped_text(self):
+        item = _item(summary=TRICKY_TEXT, description=TRICKY_TEXT)
+        todo, _ = assignment_to_vtodo(item, "abc", NOW)
+        self.assertSameTodo(todo, _old_vtodo(item, "abc"))
+        event, _ = no_class_to_vevent(item, "abc", NOW)
+        self.assertSameEvent(event, _old_vevent(item, "abc"))
+
+    def test_folds_multibyte_text(self):
+        item = _item(summary=LONG_UNICODE, description=LONG_UNICODE)
+        todo, _ = assignment_to_vtodo(item, "abc", NOW)
+        self.assertFolded(to_calendar(todo))
+        self.assertSameTodo(todo, _old_vtodo(item, "abc"))
+        event, _ = no_class_to_vevent(item, "abc", NOW)
+        self.assertFolded(to_calendar(event))
+        self.assertSameEvent(event, _old_vevent(item, "abc"))
+
+    def test_date_values(self):
+        starts = [
+            date(2025, 3, 10),
+            datetime(2025, 3, 10, 23, 59, tzinfo=timezone.utc),
+            datetime(2025, 3, 10, 23, 59),
+            # Other zones are sent as the same instant in UTC
+            datetime(2025, 3, 10, 17, 59, tzinfo=ZoneInfo("America/Denver")),
+        ]
+        for start in starts:
+            with self.subTest(start=start):
+                end = start if isinstance(start, datetime) else date(2025, 3, 11)
+                item = _item(dtstart=vDDDTypes(start), dtend=vDDDTypes(end))
+                todo, _ = assignment_to_vtodo(item, "abc", NOW)
+                self.assertSameTodo(todo, _old_vtodo(item, "abc"))
+                event, _ = no_class_to_vevent(item, "abc", NOW)
+                self.assertSameEvent(event, _old_vevent(item, "abc"))
+
+    def test_categories(self):
+        item = _item(course_id="IT-3150, Section 1", type_tag="HW;Lab")
+        todo, _ = assignment_to_vtodo(item, "abc", NOW)
+        self.assertSameTodo(todo, _old_vtodo(item, "abc"))
+        event, _ = no_class_to_vevent(item, "abc", NOW)
+        self.assertSameEvent(event, _old_vevent(item, "abc"))
+
+        # icalendar splits parsed categories on escaped commas too, so also
+        # check that the escaping on the wire is unchanged
+        old = _old_calendar(_old_vtodo(item, "abc"))
+        self.assertEqual(_line(todo, "CATEGORIES"), _line(old, "CATEGORIES"))
+        self.assertEqual(
+            _line(todo, "CATEGORIES"), "CATEGORIES:IT-3150\\, Section 1,HW\\;Lab"
+        )
+
+        item = _item(course_id="", type_tag="")
+        todo, _ = assignment_to_vtodo(item, "abc", NOW)
+        self.assertNotIn("CATEGORIES", _parse(to_calendar(todo), "VTODO"))
+
+    def test_update_preserves_status(self):
+        stored = _parse(
+            "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//x//EN\r\n"
+            "BEGIN:VTODO\r\nUID:canvas-task-event-assignment-1\r\n"
+            "SUMMARY:Homework 1\r\nCREATED:20250101T080000Z\r\n"
+            "STATUS:COMPLETED\r\nPERCENT-COMPLETE:100\r\n"
+            "COMPLETED:20250102T090000Z\r\nX-CANVAS-HASH:old\r\n"
+            "END:VTODO\r\nEND:VCALENDAR\r\n",
+            "VTODO",
+        )
+        item = _item(summary=TRICKY_TEXT)
+        todo = update_vtodo(stored, item, "new", NOW)
+        self.assertSameTodo(todo, _old_vtodo(item, "new", stored))
+
+        parsed = _parse(to_calendar(todo), "VTODO")
+        self.assertEqual(str(parsed["STATUS"]), "COMPLETED")
+        self.assertEqual(int(parsed["PERCENT-COMPLETE"]), 100)
+        self.assertEqual(
+            parsed["COMPLETED"].dt, datetime(2025, 1, 2, 9, tzinfo=timezone.utc)
+        )
+        self.assertIsNone(update_vtodo(parsed, item, "new", NOW))
+
+    def test_update_vevent_keeps_created(self):
+        stored = _parse(
+            "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//x//EN\r\n"
+            "BEGIN:VEVENT\r\nUID:canvas-event-event-assignment-1\r\n"
+            "SUMMARY:No Classes\r\nCREATED:20250101T080000Z\r\n"
+            "X-CANVAS-HASH:old\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n",
+            "VEVENT",
+        )
+        item = _item(summary=TRICKY_TEXT, dtend=vDDDTypes(date(2025, 3, 11)))
+        event = update_vevent(stored, item, "new", NOW)
+        self.assertSameEvent(event, _old_vevent(item, "new", stored))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+"""Tests for how sync_to_caldav splits Canvas items against the server's."""
+
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from unittest import mock
+
+from icalendar import vDDDTypes
+
+from caldav_client import ExistingItem
+from ical_helpers import compute_item_hash, task_description
+import sync
+
+
+def _assignment(uid: str) -> dict:
+    """A Canvas assignment as canvas.classify_items builds it."""
+    item = {
+        "uid": uid,
+        "summary": f"Homework {uid}",
+        "description": "",
+        "url": "",
+        "location": "",
+        "dtstart": vDDDTypes(datetime(2025, 3, 10, 23, 59, tzinfo=timezone.utc)),
+        "dtend": None,
+        "course_id": "IT-3150",
+        "type_tag": "HW",
+    }
+    item["description_full"] = task_description(item)
+    return item
+
+
+def _event(uid: str) -> dict:
+    """A no-class day as canvas.classify_items builds it."""
+    item = _assignment(uid)
+    item["summary"] = f"No Classes {uid}"
+    return item
+
+
+class FakeResource:
+    def __init__(self, calendar, uid: str):
+        self.calendar = calendar
+        self.uid = uid
+        self.props = {}
+
+    def delete(self):
+        self.calendar.deleted.append(self.uid)
+
+
+class FakeCalendar:
+    url = "https://dav.example.com/cal/"
+
+    def __init__(self):
+        self.saved = []
+        self.deleted = []
+
+    def save_todo(self, ical: str):
+        self.saved.append(ical)
+
+    def save_event(self, ical: str):
+        self.saved.append(ical)
+
+    def existing(self, uid: str, component_name: str, item: dict | None = None):
+        """A stored item, with the hash of item if it is still up to date."""
+        content_hash = compute_item_hash(item) if item else "stale"
+        return ExistingItem(content_hash, FakeResource(self, uid), None, component_name)
+
+
+class RemovedItemsTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.state_path = os.path.join(directory.name, "state.json")
+        self.calendar = FakeCalendar()
+
+    def _sync(self, assignments, events, existing_todos, existing_events):
+        with (
+            mock.patch.object(
+                sync,
+                "get_existing_items",
+                return_value=(existing_todos, existing_events),
+            ),
+            redirect_stdout(io.StringIO()),
+        ):
+            sync.sync_to_caldav(
+                assignments,
+                events,
+                self.calendar,
+                delete_removed=True,
+                state_path=self.state_path,
+            )
+
+    def test_removed_uids_only_include_own_prefix(self):
+        existing = {
+            "canvas-task-kept": None,
+            "canvas-task-gone": None,
+            "canvas-event-gone": None,
+            "user-made-task": None,
+        }
+        wanted = {"canvas-task-kept": None}
+        self.assertEqual(
+            sync._removed_uids(existing, wanted, "task"), ["canvas-task-gone"]
+        )
+
+    def test_removed_uids_skip_an_empty_section(self):
+        existing = {"canvas-task-gone": None}
+        self.assertEqual(sync._removed_uids(existing, {}, "task"), [])
+
+    def test_known_new_and_removed(self):
+        kept = _assignment("kept")
+        calendar = self.calendar
+        existing_todos = {
+            "canvas-task-kept": calendar.existing("canvas-task-kept", "VTODO", kept),
+            "canvas-task-gone": calendar.existing("canvas-task-gone", "VTODO"),
+            "user-made-task": calendar.existing("user-made-task", "VTODO"),
+        }
+        self._sync([kept, _assignment("new")], [_event("e")], existing_todos, {})
+
+        self.assertEqual(calendar.deleted, ["canvas-task-gone"])
+        # Writes run in a pool, so the order they land in isn't fixed
+        saved_uids = sorted(
+            line
+            for ical in calendar.saved
+            for line in ical.split("\r\n")
+            if line.startswith("UID:")
+        )
+        self.assertEqual(saved_uids, ["UID:canvas-event-e", "UID:canvas-task-new"])
+
+    def test_empty_section_deletes_nothing(self):
+        calendar = self.calendar
+        existing_todos = {
+            "canvas-task-done": calendar.existing("canvas-task-done", "VTODO"),
+        }
+        existing_events = {
+            "canvas-event-gone": calendar.existing("canvas-event-gone", "VEVENT"),
+        }
+        self._sync([], [_event("e")], existing_todos, existing_events)
+
+        self.assertEqual(calendar.deleted, ["canvas-event-gone"])
+
+
+if __name__ == "__main__":
+    unittest.main()